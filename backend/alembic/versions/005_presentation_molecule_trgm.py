@@ -0,0 +1,35 @@
+"""Add trigram index on presentations.molecule
+
+Revision ID: 005
+Revises: 004
+Create Date: 2024-12-20
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '005'
+down_revision: Union[str, None] = '004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Extension trigram pour les recherches ILIKE '%...%'
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Index GIN trigram: gin_trgm_ops supporte ILIKE '%molecule%' sans seq scan
+    op.create_index(
+        'ix_presentations_molecule_trgm',
+        'presentations',
+        ['molecule'],
+        postgresql_using='gin',
+        postgresql_ops={'molecule': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_presentations_molecule_trgm', 'presentations')
@@ -0,0 +1,37 @@
+"""Add dosage_norm generated column to presentations
+
+Revision ID: 006
+Revises: 005
+Create Date: 2024-12-20
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '006'
+down_revision: Union[str, None] = '005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Colonne generee: dosage en minuscules sans espaces ("40 mg" -> "40mg")
+    # Calculee par PostgreSQL (backfill automatique des lignes existantes)
+    op.add_column('presentations', sa.Column(
+        'dosage_norm',
+        sa.String(50),
+        sa.Computed("lower(regexp_replace(dosage, '\\s+', '', 'g'))", persisted=True),
+        nullable=True
+    ))
+
+    # Index pour filtrer par egalite sur le dosage
+    op.create_index('ix_presentations_dosage_norm', 'presentations', ['dosage_norm'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_presentations_dosage_norm', 'presentations')
+    op.drop_column('presentations', 'dosage_norm')
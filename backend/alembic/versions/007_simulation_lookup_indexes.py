@@ -0,0 +1,44 @@
+"""Add lookup indexes on mes_ventes.import_id and resultats_simulation.scenario_id
+
+Revision ID: 007
+Revises: 006
+Create Date: 2024-12-20
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '007'
+down_revision: Union[str, None] = '006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Toutes les pages (matching, simulation, couverture, optimisation)
+    # chargent les ventes d'un import: evite un seq scan de mes_ventes
+    op.create_index('ix_mes_ventes_import_id', 'mes_ventes', ['import_id'])
+
+    # Index couvrant pour les totaux d'un scenario (TOTAUX_COLUMNS):
+    # index-only scan, sans lecture du heap de resultats_simulation
+    op.create_index(
+        'ix_resultats_simulation_scenario_totaux',
+        'resultats_simulation',
+        ['scenario_id'],
+        postgresql_include=[
+            'montant_ht',
+            'montant_remise_ligne',
+            'montant_remontee',
+            'montant_total_remise',
+            'disponible',
+            'statut_remontee',
+        ],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_resultats_simulation_scenario_totaux', 'resultats_simulation')
+    op.drop_index('ix_mes_ventes_import_id', 'mes_ventes')
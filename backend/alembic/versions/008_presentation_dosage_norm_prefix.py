@@ -0,0 +1,35 @@
+"""Replace the dosage_norm index with a text_pattern_ops index for prefix matching
+
+Revision ID: 008
+Revises: 007
+Create Date: 2024-12-20
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '008'
+down_revision: Union[str, None] = '007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Le filtre dosage est un prefixe (dosage_norm LIKE '500mg%') pour garder
+    # les dosages composes ("500mg/5ml"): un btree classique ne sert pas LIKE
+    # hors collation C, text_pattern_ops sert a la fois LIKE 'x%' et l'egalite
+    op.drop_index('ix_presentations_dosage_norm', 'presentations')
+    op.create_index(
+        'ix_presentations_dosage_norm_prefix',
+        'presentations',
+        ['dosage_norm'],
+        postgresql_ops={'dosage_norm': 'text_pattern_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_presentations_dosage_norm_prefix', 'presentations')
+    op.create_index('ix_presentations_dosage_norm', 'presentations', ['dosage_norm'])
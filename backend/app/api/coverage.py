@@ -18,6 +18,9 @@ from app.schemas import (
 
 router = APIRouter(prefix="/api/coverage", tags=["Coverage & Combo"])
 
+# Taille des paquets pour la lecture en flux des matchings
+MATCHING_STREAM_SIZE = 10000
+
 
 @router.get("/best-combo/{labo_principal_id}", response_model=BestComboResponse)
 def get_best_combo(
@@ -248,9 +251,7 @@ def get_coverage_gaps(
         for m in matchings_by_vente.get(vente_id, []):
             if m.labo_id != labo_id and m.produit_id:
                 labo_alt = labo_map.get(m.labo_id)
-                produit = db.query(CatalogueProduit).filter(
-                    CatalogueProduit.id == m.produit_id
-                ).first()
+                produit = db.get(CatalogueProduit, m.produit_id)
                 if labo_alt and produit:
                     alternatives.append({
                         "labo_id": m.labo_id,
@@ -309,22 +310,33 @@ def get_coverage_matrix(
         raise HTTPException(status_code=404, detail="Aucune vente trouvee")
 
     vente_ids = [v.id for v in ventes]
+    ventes_map = {v.id: v for v in ventes}
     total_ventes = len(ventes)
     total_montant = sum(v.montant_annuel or Decimal("0") for v in ventes)
 
-    # Tous les matchings
-    matchings = db.query(VenteMatching).filter(VenteMatching.vente_id.in_(vente_ids)).all()
-    if not matchings:
-        return {"error": "Matching non effectue"}
+    # Tous les matchings, lus en flux (colonnes seules, par paquets)
+    # pour ne pas materialiser ventes x labos objets ORM
+    matchings = db.query(
+        VenteMatching.vente_id,
+        VenteMatching.labo_id,
+        VenteMatching.produit_id
+    ).filter(
+        VenteMatching.vente_id.in_(vente_ids)
+    ).yield_per(MATCHING_STREAM_SIZE)
 
     # Grouper par labo: set de vente_ids matchees
+    has_matchings = False
     coverage_by_labo = {}
     for m in matchings:
+        has_matchings = True
         if m.produit_id:  # Match valide
             if m.labo_id not in coverage_by_labo:
                 coverage_by_labo[m.labo_id] = set()
             coverage_by_labo[m.labo_id].add(m.vente_id)
 
+    if not has_matchings:
+        return {"error": "Matching non effectue"}
+
     # Recuperer les labos
     labo_ids = list(coverage_by_labo.keys())
     labos = db.query(Laboratoire).filter(Laboratoire.id.in_(labo_ids)).all()
@@ -338,7 +350,7 @@ def get_coverage_matrix(
             continue
 
         montant_couvert = sum(
-            (next((v.montant_annuel for v in ventes if v.id == vid), Decimal("0")) or Decimal("0"))
+            (ventes_map[vid].montant_annuel or Decimal("0"))
             for vid in vente_set
         )
 
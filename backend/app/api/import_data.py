@@ -14,6 +14,9 @@ from app.utils.logger import import_catalogue_logger, import_ventes_logger, Oper
 
 router = APIRouter(prefix="/api/import", tags=["Import"])
 
+# Taille des paquets pour les INSERT en masse (executemany)
+BULK_INSERT_SIZE = 1000
+
 
 @router.post("/catalogue", response_model=ImportResponse)
 async def import_catalogue(
@@ -127,6 +130,7 @@ async def import_catalogue(
 
         nb_imported = 0
         nb_error = 0
+        batch = []
 
         for _, row in df.iterrows():
             try:
@@ -136,15 +140,14 @@ async def import_catalogue(
                 remise_pct = parse_percent(row.get(mapped_cols.get("remise_pct", ""))) if mapped_cols.get("remise_pct") else None
 
                 if code_cip or designation:
-                    produit = CatalogueProduit(
+                    batch.append(dict(
                         laboratoire_id=laboratoire_id,
                         code_cip=code_cip if code_cip else None,
                         nom_commercial=designation if designation else None,
                         prix_ht=prix_ht if prix_ht else None,
                         remise_pct=remise_pct if remise_pct else None,
                         source='manuel',  # Marquer comme import manuel
-                    )
-                    db.add(produit)
+                    ))
                     nb_imported += 1
                     metrics.increment(success=True)
                 else:
@@ -153,6 +156,12 @@ async def import_catalogue(
                 nb_error += 1
                 metrics.increment(success=False)
 
+            if len(batch) >= BULK_INSERT_SIZE:
+                db.execute(CatalogueProduit.__table__.insert(), batch)
+                batch = []
+
+        if batch:
+            db.execute(CatalogueProduit.__table__.insert(), batch)
         db.commit()
 
         # Mettre a jour l'import
@@ -309,6 +318,7 @@ async def import_ventes(
         nb_imported = 0
         nb_error = 0
         total_montant = 0
+        batch = []
 
         for _, row in df.iterrows():
             try:
@@ -321,7 +331,7 @@ async def import_ventes(
                 montant = quantite * prix_unitaire if quantite and prix_unitaire else None
 
                 if code_cip or designation:
-                    vente = MesVentes(
+                    batch.append(dict(
                         import_id=db_import.id,
                         code_cip_achete=code_cip if code_cip else None,
                         designation=designation if designation else None,
@@ -329,8 +339,7 @@ async def import_ventes(
                         prix_achat_unitaire=prix_unitaire,
                         montant_annuel=montant,
                         labo_actuel=labo if labo else None,
-                    )
-                    db.add(vente)
+                    ))
                     nb_imported += 1
                     if montant:
                         total_montant += montant
@@ -341,6 +350,12 @@ async def import_ventes(
                 nb_error += 1
                 metrics.increment(success=False)
 
+            if len(batch) >= BULK_INSERT_SIZE:
+                db.execute(MesVentes.__table__.insert(), batch)
+                batch = []
+
+        if batch:
+            db.execute(MesVentes.__table__.insert(), batch)
         db.commit()
 
         # === ENRICHISSEMENT BDPM: Ajouter prix BDPM et groupe_generique_id ===
@@ -387,7 +402,7 @@ async def extract_pdf(
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Le fichier doit etre un PDF")
 
-    start_time = time.time()
+    start_time = time.perf_counter()
     content = await file.read()
 
     result = await extract_catalogue_from_pdf(
@@ -397,7 +412,7 @@ async def extract_pdf(
         modele_ia=modele_ia,
     )
 
-    elapsed = time.time() - start_time
+    elapsed = time.perf_counter() - start_time
 
     return ExtractionPDFResponse(
         lignes=[LigneExtraite(**l) for l in result["lignes"]],
@@ -3,16 +3,17 @@ Import avec rapprochement - Preview et confirmation.
 """
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import Dict, Any, Tuple
 import pandas as pd
 import io
 import time
 import hashlib
 
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 
 from app.db import get_db
 from app.models import CatalogueProduit, Laboratoire
+from app.api.import_data import BULK_INSERT_SIZE
 
 router = APIRouter(prefix="/api/import", tags=["Import Rapprochement"])
 
@@ -37,12 +38,17 @@ def _normalize_name(name: str) -> str:
 def _match_product(
     code_cip: str,
     designation: str,
-    existing_products: List[CatalogueProduit],
     cip_index: Dict[str, CatalogueProduit],
+    name_index: Dict[str, CatalogueProduit],
+    named_products: Tuple[CatalogueProduit, ...],
+    product_names: Tuple[str, ...],
 ) -> tuple:
     """
     Trouve un produit existant qui correspond.
     Retourne (produit, match_type, score).
+
+    Les noms normalises sont prepares une fois par import (name_index,
+    product_names); un nom identique court-circuite le fuzzy (WRatio = 100).
     """
     clean_cip = _clean_cip(code_cip)
 
@@ -53,20 +59,23 @@ def _match_product(
     # 2. Match fuzzy par nom
     if designation:
         norm_name = _normalize_name(designation)
-        best_match = None
-        best_score = 0.0
-
-        for prod in existing_products:
-            if prod.nom_commercial:
-                prod_norm = _normalize_name(prod.nom_commercial)
-                # Utilise WRatio pour gerer les mots dans le desordre
-                score = fuzz.WRatio(norm_name, prod_norm)
-                if score > best_score and score >= 80:
-                    best_score = score
-                    best_match = prod
 
-        if best_match:
-            return best_match, "fuzzy_name", best_score
+        # Nom identique: seul cas ou WRatio vaut 100, premier produit retenu
+        exact = name_index.get(norm_name)
+        if exact is not None:
+            return exact, "fuzzy_name", 100.0
+
+        # Utilise WRatio pour gerer les mots dans le desordre
+        best = process.extractOne(
+            norm_name,
+            product_names,
+            scorer=fuzz.WRatio,
+            processor=None,
+            score_cutoff=80
+        )
+        if best:
+            _, best_score, idx = best
+            return named_products[idx], "fuzzy_name", best_score
 
     return None, "none", 0.0
 
@@ -140,6 +149,14 @@ async def preview_catalogue_import(
                 if clean:
                     cip_index[clean] = prod
 
+        # Noms normalises une seule fois (et non a chaque ligne du fichier)
+        named_products = tuple(p for p in existing_products if p.nom_commercial)
+        product_names = tuple(_normalize_name(p.nom_commercial) for p in named_products)
+        name_index = {}
+        for prod, norm in zip(named_products, product_names):
+            if norm:
+                name_index.setdefault(norm, prod)
+
         # Analyser chaque ligne du fichier
         nouveaux = []
         mis_a_jour = []
@@ -176,7 +193,7 @@ async def preview_catalogue_import(
 
                 # Chercher un match
                 matched_product, match_type, match_score = _match_product(
-                    code_cip, designation, existing_products, cip_index
+                    code_cip, designation, cip_index, name_index, named_products, product_names
                 )
 
                 ligne_data = {
@@ -304,10 +321,10 @@ async def confirm_catalogue_import(
     nb_maj = 0
 
     try:
-        # 1. Creer les nouveaux produits
+        # 1. Creer les nouveaux produits (INSERT en masse par paquets)
         if apply_nouveaux:
-            for item in preview_data["nouveaux"]:
-                produit = CatalogueProduit(
+            nouveaux = [
+                dict(
                     laboratoire_id=labo_id,
                     code_cip=item.get("code_cip"),
                     nom_commercial=item.get("designation"),
@@ -315,8 +332,11 @@ async def confirm_catalogue_import(
                     remise_pct=item.get("remise_pct_import"),
                     source="manuel",
                 )
-                db.add(produit)
-                nb_crees += 1
+                for item in preview_data["nouveaux"]
+            ]
+            for i in range(0, len(nouveaux), BULK_INSERT_SIZE):
+                db.execute(CatalogueProduit.__table__.insert(), nouveaux[i:i + BULK_INSERT_SIZE])
+            nb_crees = len(nouveaux)
 
         # 2. Appliquer les mises a jour
         if apply_updates:
@@ -327,9 +347,7 @@ async def confirm_catalogue_import(
                 if update_ids is not None and produit_id not in update_ids:
                     continue
 
-                produit = db.query(CatalogueProduit).filter(
-                    CatalogueProduit.id == produit_id
-                ).first()
+                produit = db.get(CatalogueProduit, produit_id) if produit_id else None
 
                 if produit:
                     for change in item.get("changes", []):
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import exists
 from sqlalchemy.orm import Session
 from typing import List
 
@@ -34,7 +35,7 @@ def get_laboratoire(labo_id: int, db: Session = Depends(get_db)):
 def create_laboratoire(labo: LaboratoireCreate, db: Session = Depends(get_db)):
     """Cree un nouveau laboratoire."""
     # Verifier unicite du nom
-    existing = db.query(Laboratoire).filter(Laboratoire.nom == labo.nom).first()
+    existing = db.query(exists().where(Laboratoire.nom == labo.nom)).scalar()
     if existing:
         raise HTTPException(status_code=400, detail="Un laboratoire avec ce nom existe deja")
 
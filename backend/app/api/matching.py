@@ -1,5 +1,7 @@
 """API endpoints pour le matching intelligent des ventes."""
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import exists, func, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 from typing import List
 import time
@@ -32,6 +34,7 @@ def get_matching_stats_internal(db: Session, import_id: int) -> dict:
     """
     ventes = db.query(MesVentes).filter(MesVentes.import_id == import_id).all()
     vente_ids = [v.id for v in ventes]
+    ventes_map = {v.id: v for v in ventes}
 
     if not vente_ids:
         return {"matched": 0, "unmatched": 0, "by_lab": []}
@@ -47,7 +50,7 @@ def get_matching_stats_internal(db: Session, import_id: int) -> dict:
 
     for m in matchings:
         if m.labo_id not in by_lab:
-            labo = db.query(Laboratoire).filter(Laboratoire.id == m.labo_id).first()
+            labo = db.get(Laboratoire, m.labo_id)
             by_lab[m.labo_id] = {
                 "lab_id": m.labo_id,
                 "lab_nom": labo.nom if labo else "?",
@@ -55,7 +58,7 @@ def get_matching_stats_internal(db: Session, import_id: int) -> dict:
                 "total_montant": Decimal("0")
             }
 
-        vente = next((v for v in ventes if v.id == m.vente_id), None)
+        vente = ventes_map.get(m.vente_id)
         if vente:
             by_lab[m.labo_id]["matched_count"] += 1
             by_lab[m.labo_id]["total_montant"] += vente.montant_annuel or Decimal("0")
@@ -105,7 +108,7 @@ def process_sales_matching(
     Returns:
         Stats du matching: nb matches, unmatched, couverture par labo
     """
-    start_time = time.time()
+    start_time = time.perf_counter()
 
     # Verifier l'import
     import_obj = db.query(Import).filter(Import.id == request.import_id).first()
@@ -123,15 +126,19 @@ def process_sales_matching(
 
     # === CACHE CHECK: Si matching existe et pas force_rematch, retourner stats ===
     if not force_rematch:
-        existing_matchings = db.query(VenteMatching).filter(
-            VenteMatching.vente_id.in_(vente_ids)
-        ).first()
+        # EXISTS (semi-jointure sur l'import): s'arrete au premier matching trouve
+        existing_matchings = db.query(
+            exists().where(
+                VenteMatching.vente_id == MesVentes.id,
+                MesVentes.import_id == request.import_id
+            )
+        ).scalar()
 
         if existing_matchings:
             # Matching existe deja, retourner les stats depuis le cache
             matching_logger.info(f"Matching cache trouve pour import {request.import_id}, utilisation du cache")
             stats = get_matching_stats_internal(db, request.import_id)
-            elapsed = time.time() - start_time
+            elapsed = time.perf_counter() - start_time
             return ProcessSalesResponse(
                 import_id=request.import_id,
                 total_ventes=len(ventes),
@@ -172,8 +179,14 @@ def process_sales_matching(
         force_rematch=force_rematch
     )
 
-    # Initialiser le matcher
+    # Initialiser le matcher (groupes BDPM des ventes charges en une requete,
+    # fuzzy molecule des ventes sans groupe calcule en lot par labo)
     matcher = IntelligentMatcher(db)
+    matcher.prefetch_bdpm_groupes([v.code_cip_achete for v in ventes])
+    matcher.prefetch_molecule_matches(
+        [v.designation for v in ventes if v.designation and not v.groupe_generique_id],
+        labo_ids
+    )
 
     # Supprimer les anciens matchings pour cet import
     db.query(VenteMatching).filter(
@@ -205,6 +218,9 @@ def process_sales_matching(
     # Compteurs pour stats de type de matching
     match_type_stats = {"groupe_generique": 0, "fuzzy": 0, "no_match": 0}
 
+    # Lignes VenteMatching a inserer
+    matching_rows = []
+
     # Matcher chaque vente
     for vente in ventes:
         designation = vente.designation or ""
@@ -249,9 +265,7 @@ def process_sales_matching(
                 if matches and matches[0].score >= request.min_score:
                     best = matches[0]
                     # Recuperer le produit pour l'objet VenteMatching
-                    matched_product = db.query(CatalogueProduit).filter(
-                        CatalogueProduit.id == best.produit_id
-                    ).first()
+                    matched_product = db.get(CatalogueProduit, best.produit_id)
                     match_type = best.match_type
                     match_score = best.score
 
@@ -259,16 +273,15 @@ def process_sales_matching(
             metrics.increment(success=bool(matched_product))
 
             if matched_product:
-                # Stocker le matching
-                vm = VenteMatching(
+                # Stocker le matching (insere en masse apres la boucle)
+                matching_rows.append(dict(
                     vente_id=vente.id,
                     labo_id=labo_id,
                     produit_id=matched_product.id,
                     match_score=Decimal(str(match_score)),
                     match_type=match_type,
                     matched_on=f"Groupe {groupe_id}" if match_type == "groupe_generique" else None
-                )
-                db.add(vm)
+                ))
                 has_match = True
                 matched_ventes.add(vente.id)
                 by_lab_stats[labo_id]["matched_count"] += 1
@@ -290,6 +303,9 @@ def process_sales_matching(
             })
             match_type_stats["no_match"] += 1
 
+    # Un seul INSERT multi-lignes (les anciens matchings ont ete supprimes plus haut)
+    if matching_rows:
+        db.execute(VenteMatching.__table__.insert(), matching_rows)
     db.commit()
 
     # Calculer le montant total des ventes
@@ -310,7 +326,7 @@ def process_sales_matching(
     # Trier par couverture decroissante
     by_lab_list.sort(key=lambda x: x["matched_count"], reverse=True)
 
-    elapsed = time.time() - start_time
+    elapsed = time.perf_counter() - start_time
 
     # === LOGGING: Finaliser les métriques ===
     metrics.finish(
@@ -374,7 +390,7 @@ def analyze_match(
         )
 
         for m in matches[:3]:  # Top 3 par labo
-            produit = db.query(CatalogueProduit).filter(CatalogueProduit.id == m.produit_id).first()
+            produit = db.get(CatalogueProduit, m.produit_id)
             matches_by_lab.append(MatchResultItem(
                 produit_id=m.produit_id,
                 labo_id=labo.id,
@@ -420,6 +436,7 @@ def get_matching_stats(
     # Recuperer les ventes
     ventes = db.query(MesVentes).filter(MesVentes.import_id == import_id).all()
     vente_ids = [v.id for v in ventes]
+    ventes_map = {v.id: v for v in ventes}
 
     if not vente_ids:
         return {"import_id": import_id, "total_ventes": 0, "matching_done": False}
@@ -441,7 +458,7 @@ def get_matching_stats(
 
     for m in matchings:
         if m.labo_id not in by_lab:
-            labo = db.query(Laboratoire).filter(Laboratoire.id == m.labo_id).first()
+            labo = db.get(Laboratoire, m.labo_id)
             by_lab[m.labo_id] = {
                 "lab_id": m.labo_id,
                 "lab_nom": labo.nom if labo else "?",
@@ -450,7 +467,7 @@ def get_matching_stats(
                 "avg_score": []
             }
 
-        vente = next((v for v in ventes if v.id == m.vente_id), None)
+        vente = ventes_map.get(m.vente_id)
         if vente:
             by_lab[m.labo_id]["matched_count"] += 1
             by_lab[m.labo_id]["total_montant"] += vente.montant_annuel or Decimal("0")
@@ -706,30 +723,29 @@ def set_manual_matching(
     if not produit:
         raise HTTPException(status_code=404, detail="Produit non trouve dans ce laboratoire")
 
-    # Chercher un matching existant
-    existing = db.query(VenteMatching).filter(
-        VenteMatching.vente_id == vente_id,
-        VenteMatching.labo_id == labo_id
-    ).first()
-
-    if existing:
-        # Mettre a jour
-        existing.produit_id = produit_id
-        existing.match_score = Decimal("100")  # Score manuel = 100%
-        existing.match_type = "manual"
-        existing.matched_on = f"Correction manuelle: {produit.nom_commercial}"
-    else:
-        # Creer nouveau
-        vm = VenteMatching(
-            vente_id=vente_id,
-            labo_id=labo_id,
-            produit_id=produit_id,
-            match_score=Decimal("100"),
-            match_type="manual",
-            matched_on=f"Correction manuelle: {produit.nom_commercial}"
-        )
-        db.add(vm)
+    # Upsert en une requete (contrainte uq_vente_labo)
+    # xmax = 0 uniquement pour une ligne nouvellement inseree
+    stmt = pg_insert(VenteMatching).values(
+        vente_id=vente_id,
+        labo_id=labo_id,
+        produit_id=produit_id,
+        match_score=Decimal("100"),  # Score manuel = 100%
+        match_type="manual",
+        matched_on=f"Correction manuelle: {produit.nom_commercial}"
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_vente_labo",
+        set_={
+            "produit_id": stmt.excluded.produit_id,
+            "match_score": stmt.excluded.match_score,
+            "match_type": stmt.excluded.match_type,
+            "matched_on": stmt.excluded.matched_on,
+            # onupdate n'est pas applique par ON CONFLICT DO UPDATE
+            "updated_at": func.now(),
+        }
+    ).returning(literal_column("(xmax = 0)").label("inserted"))
 
+    inserted = db.execute(stmt).scalar()
     db.commit()
 
     return {
@@ -738,7 +754,7 @@ def set_manual_matching(
         "labo_id": labo_id,
         "produit_id": produit_id,
         "produit_nom": produit.nom_commercial,
-        "message": "Matching mis a jour" if existing else "Matching cree"
+        "message": "Matching cree" if inserted else "Matching mis a jour"
     }
 
 
@@ -13,7 +13,7 @@ from decimal import Decimal
 
 from app.db import get_db
 from app.models import Laboratoire, CatalogueProduit, MesVentes, VenteMatching, Import
-from app.services.optimizer import optimize_multi_labo, LaboObjective
+from app.services.optimizer import optimize_multi_labo, optimize_multi_labo_batch, LaboObjective, OptimizationResult
 
 router = APIRouter(prefix="/api/optimization", tags=["Optimization"])
 
@@ -39,6 +39,13 @@ class OptimizeRequest(BaseModel):
     max_time_seconds: int = 30
 
 
+class OptimizeBatchRequest(BaseModel):
+    """Request pour optimiser plusieurs scenarios (jeux d'objectifs) d'un import."""
+    import_id: int
+    scenarios: list[list[LaboObjectiveInput]]
+    max_time_seconds: int = 30
+
+
 class LaboRepartitionResponse(BaseModel):
     """Repartition pour un labo."""
     labo_id: int
@@ -91,6 +98,7 @@ def get_labos_disponibles(
         raise HTTPException(status_code=404, detail="Aucune vente pour cet import")
 
     vente_ids = [v.id for v in ventes]
+    ventes_map = {v.id: v for v in ventes}
 
     # Trouver les labos qui ont des matchings
     from sqlalchemy import func
@@ -134,12 +142,10 @@ def get_labos_disponibles(
 
         potentiel = Decimal("0")
         for m in matchings:
-            vente = next((v for v in ventes if v.id == m.vente_id), None)
+            vente = ventes_map.get(m.vente_id)
             if not vente:
                 continue
-            produit = db.query(CatalogueProduit).filter(
-                CatalogueProduit.id == m.produit_id
-            ).first()
+            produit = db.get(CatalogueProduit, m.produit_id)
             if produit and produit.prix_ht:
                 potentiel += produit.prix_ht * (vente.quantite_annuelle or 0)
 
@@ -242,33 +248,73 @@ def run_optimization(
     if not import_obj:
         raise HTTPException(status_code=404, detail="Import non trouve")
 
-    # Verifier les labos
-    labo_ids = [obj.labo_id for obj in request.objectives]
+    _check_labos(db, request.objectives)
+
+    # Lancer l'optimisation
+    result = optimize_multi_labo(
+        db=db,
+        import_id=request.import_id,
+        objectives=_to_labo_objectives(request.objectives),
+        max_time_seconds=request.max_time_seconds
+    )
+
+    return _to_response(result, include_ventes)
+
+
+@router.post("/run-batch", response_model=list[OptimizeResponse])
+def run_optimization_batch(
+    request: OptimizeBatchRequest,
+    include_ventes: bool = Query(False, description="Inclure details ventes dans response"),
+    db: Session = Depends(get_db)
+):
+    """
+    Execute l'optimisation multi-labos pour plusieurs scenarios d'un meme import.
+
+    Les scenarios sont resolus en parallele (un process par scenario);
+    les resultats sont renvoyes dans l'ordre des scenarios.
+    """
+    # Verifier l'import
+    import_obj = db.query(Import).filter(Import.id == request.import_id).first()
+    if not import_obj:
+        raise HTTPException(status_code=404, detail="Import non trouve")
+
+    for scenario in request.scenarios:
+        _check_labos(db, scenario)
+
+    results = optimize_multi_labo_batch(
+        import_id=request.import_id,
+        scenarios=[_to_labo_objectives(scenario) for scenario in request.scenarios],
+        max_time_seconds=request.max_time_seconds
+    )
+
+    return [_to_response(result, include_ventes) for result in results]
+
+
+def _check_labos(db: Session, objectives: list[LaboObjectiveInput]) -> None:
+    """Verifie que tous les labos des objectifs existent."""
+    labo_ids = [obj.labo_id for obj in objectives]
     labos = db.query(Laboratoire).filter(Laboratoire.id.in_(labo_ids)).all()
     if len(labos) != len(labo_ids):
         missing = set(labo_ids) - {l.id for l in labos}
         raise HTTPException(status_code=404, detail=f"Labos non trouves: {missing}")
 
-    # Convertir en LaboObjective
-    objectives = []
-    for obj_input in request.objectives:
-        objectives.append(LaboObjective(
+
+def _to_labo_objectives(objectives: list[LaboObjectiveInput]) -> list[LaboObjective]:
+    """Convertit les objectifs de la requete en LaboObjective."""
+    return [
+        LaboObjective(
             labo_id=obj_input.labo_id,
             labo_nom="",  # Sera rempli par optimize_multi_labo
             objectif_pct=obj_input.objectif_pct,
             objectif_montant=Decimal(str(obj_input.objectif_montant)) if obj_input.objectif_montant else None,
             exclusions=obj_input.exclusions or []
-        ))
+        )
+        for obj_input in objectives
+    ]
 
-    # Lancer l'optimisation
-    result = optimize_multi_labo(
-        db=db,
-        import_id=request.import_id,
-        objectives=objectives,
-        max_time_seconds=request.max_time_seconds
-    )
 
-    # Convertir en response
+def _to_response(result: OptimizationResult, include_ventes: bool) -> OptimizeResponse:
+    """Convertit un OptimizationResult en response."""
     repartition_list = []
     for labo_id, data in result.repartition.items():
         rep = LaboRepartitionResponse(
@@ -325,6 +371,7 @@ def preview_optimization(
         raise HTTPException(status_code=404, detail="Aucune vente pour cet import")
 
     vente_ids = [v.id for v in ventes]
+    ventes_map = {v.id: v for v in ventes}
 
     # Calculer potentiels
     preview = []
@@ -347,13 +394,11 @@ def preview_optimization(
             if obj_input.exclusions and m.produit_id in obj_input.exclusions:
                 continue
 
-            vente = next((v for v in ventes if v.id == m.vente_id), None)
+            vente = ventes_map.get(m.vente_id)
             if not vente:
                 continue
 
-            produit = db.query(CatalogueProduit).filter(
-                CatalogueProduit.id == m.produit_id
-            ).first()
+            produit = db.get(CatalogueProduit, m.produit_id)
             if produit and produit.prix_ht:
                 potentiel += produit.prix_ht * (vente.quantite_annuelle or 0)
                 nb_produits += 1
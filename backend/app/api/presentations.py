@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import exists, or_
 from typing import List, Optional
 
 from app.db import get_db
@@ -44,9 +44,9 @@ def get_presentation(presentation_id: int, db: Session = Depends(get_db)):
 def create_presentation(presentation: PresentationCreate, db: Session = Depends(get_db)):
     """Cree une nouvelle presentation."""
     # Verifier unicite du code_interne
-    existing = db.query(Presentation).filter(
-        Presentation.code_interne == presentation.code_interne
-    ).first()
+    existing = db.query(
+        exists().where(Presentation.code_interne == presentation.code_interne)
+    ).scalar()
     if existing:
         raise HTTPException(status_code=400, detail="Ce code interne existe deja")
 
@@ -8,7 +8,6 @@ from app.db import get_db
 from app.models import (
     MesVentes, Import, Laboratoire, VenteMatching, CatalogueProduit
 )
-from app.services.report_generator import generate_pdf_report
 from app.services.combo_optimizer import ComboOptimizer
 
 router = APIRouter(prefix="/api/reports", tags=["Reports"])
@@ -88,9 +87,7 @@ def export_simulation_pdf(
         matching = matching_map.get(vente.id)
 
         if matching and matching.produit_id:
-            produit = db.query(CatalogueProduit).filter(
-                CatalogueProduit.id == matching.produit_id
-            ).first()
+            produit = db.get(CatalogueProduit, matching.produit_id)
 
             if produit:
                 chiffre_realisable += montant
@@ -165,7 +162,7 @@ def export_simulation_pdf(
         if not matching or not matching.produit_id:
             alternatives = []
             for m in matchings_by_vente.get(vente.id, []):
-                other_labo = db.query(Laboratoire).filter(Laboratoire.id == m.labo_id).first()
+                other_labo = db.get(Laboratoire, m.labo_id)
                 if other_labo:
                     alternatives.append({
                         "labo_nom": other_labo.nom,
@@ -191,7 +188,10 @@ def export_simulation_pdf(
             "montant_remise_total": float(combo_result.montant_remise_total)
         }
 
-    # Generer le PDF
+    # Generer le PDF (import differe: matplotlib/reportlab ne sont charges
+    # qu'au premier rapport, pas au demarrage du worker)
+    from app.services.report_generator import generate_pdf_report
+
     pdf_content = generate_pdf_report(
         labo_nom=labo.nom,
         totaux=totaux,
@@ -20,7 +20,7 @@ from app.schemas import (
     SimulationLineResult,
     LaboratoireResponse,
 )
-from app.services.simulation import run_simulation, calculate_totaux
+from app.services.simulation import run_simulation, persist_resultats, calculate_totaux, TOTAUX_COLUMNS
 
 router = APIRouter(prefix="/api/scenarios", tags=["Scenarios"])
 
@@ -91,9 +91,7 @@ def run_scenario(scenario_id: int, db: Session = Depends(get_db)):
     resultats = run_simulation(db, scenario)
 
     # Sauvegarder les resultats
-    for r in resultats:
-        db_result = ResultatSimulation(**r)
-        db.add(db_result)
+    persist_resultats(db, resultats)
 
     db.commit()
     return {"message": f"Simulation terminee: {len(resultats)} resultats"}
@@ -115,7 +113,7 @@ def get_resultats(scenario_id: int, db: Session = Depends(get_db)):
 def get_totaux(scenario_id: int, db: Session = Depends(get_db)):
     """Recupere les totaux d'une simulation."""
     resultats = (
-        db.query(ResultatSimulation)
+        db.query(*TOTAUX_COLUMNS)
         .filter(ResultatSimulation.scenario_id == scenario_id)
         .all()
     )
@@ -145,7 +143,7 @@ def compare_scenarios(scenario_ids: List[int], db: Session = Depends(get_db)):
             raise HTTPException(status_code=404, detail=f"Scenario {sid} non trouve")
 
         resultats = (
-            db.query(ResultatSimulation)
+            db.query(*TOTAUX_COLUMNS)
             .filter(ResultatSimulation.scenario_id == sid)
             .all()
         )
@@ -280,9 +278,7 @@ def run_simulation_with_matching(
         match_type = None
 
         if matching and matching.produit_id:
-            produit = db.query(CatalogueProduit).filter(
-                CatalogueProduit.id == matching.produit_id
-            ).first()
+            produit = db.get(CatalogueProduit, matching.produit_id)
             disponible = produit is not None
             match_score = float(matching.match_score or 0)
             match_type = matching.match_type
@@ -1,3 +1,3 @@
-from .database import engine, SessionLocal, Base, get_db
+from .database import engine, SessionLocal, Base, get_db, warm_pool
 
-__all__ = ["engine", "SessionLocal", "Base", "get_db"]
+__all__ = ["engine", "SessionLocal", "Base", "get_db", "warm_pool"]
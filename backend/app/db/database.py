@@ -1,6 +1,8 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from concurrent.futures import ThreadPoolExecutor
 from typing import Generator
+import logging
 import os
 
 DATABASE_URL = os.getenv(
@@ -12,6 +14,8 @@ engine = create_engine(DATABASE_URL, echo=False)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+logger = logging.getLogger(__name__)
+
 
 def get_db() -> Generator:
     """Dependency to get database session."""
@@ -20,3 +24,29 @@ def get_db() -> Generator:
         yield db
     finally:
         db.close()
+
+
+def warm_pool() -> None:
+    """
+    Ouvre en parallele pool_size connexions (SELECT 1) puis les rend au pool:
+    les premieres requetes n'ont pas a payer connexion TCP + authentification.
+    """
+    def connect():
+        conn = None
+        try:
+            conn = engine.connect()
+            conn.exec_driver_sql("SELECT 1")
+            return conn
+        except Exception as e:
+            # Prechauffage best effort: ne pas bloquer le demarrage
+            logger.warning(f"Prechauffage du pool: connexion impossible ({e})")
+            if conn is not None:
+                conn.close()
+            return None
+
+    size = engine.pool.size()
+    with ThreadPoolExecutor(max_workers=size) as executor:
+        connections = list(executor.map(lambda _: connect(), range(size)))
+    for conn in connections:
+        if conn is not None:
+            conn.close()
@@ -9,6 +9,7 @@ from sqlalchemy import (
     ForeignKey,
     UniqueConstraint,
     Computed,
+    Index,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -38,11 +39,24 @@ class Laboratoire(Base):
 class Presentation(Base):
     """Table des presentations (referentiel commun = CODE INTERNE)."""
     __tablename__ = "presentations"
+    __table_args__ = (
+        # text_pattern_ops: sert l'egalite et les recherches par prefixe (LIKE 'x%')
+        Index(
+            "ix_presentations_dosage_norm_prefix",
+            "dosage_norm",
+            postgresql_ops={"dosage_norm": "text_pattern_ops"},
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     code_interne = Column(String(50), nullable=False, unique=True, index=True)  # Ex: "FURO-40-30"
     molecule = Column(String(200), nullable=False, index=True)  # "Furosemide"
     dosage = Column(String(50), nullable=True)  # "40mg"
+    # Dosage normalise (minuscules, sans espaces) pour filtrer par prefixe indexe
+    dosage_norm = Column(
+        String(50),
+        Computed("lower(regexp_replace(dosage, '\\s+', '', 'g'))", persisted=True),
+    )  # "40 MG" -> "40mg"
     forme = Column(String(50), nullable=True)  # "comprime"
     conditionnement = Column(Integer, nullable=True)  # 30
     type_conditionnement = Column(String(20), nullable=True)  # "petit" ou "grand"
@@ -132,7 +146,7 @@ class MesVentes(Base):
     __tablename__ = "mes_ventes"
 
     id = Column(Integer, primary_key=True, index=True)
-    import_id = Column(Integer, ForeignKey("imports.id"), nullable=True)
+    import_id = Column(Integer, ForeignKey("imports.id"), nullable=True, index=True)
     presentation_id = Column(Integer, ForeignKey("presentations.id"), nullable=True)
     code_cip_achete = Column(String(20), nullable=True)  # CIP du produit achete
     labo_actuel = Column(String(100), nullable=True)  # Nom labo actuel
@@ -22,6 +22,10 @@ from app.db.database import SessionLocal
 BDPM_DIR = Path(r"C:\pdf-extractor\data\bdpm\raw")
 CIS_CIP_FILE = BDPM_DIR / "CIS_CIP_bdpm.txt"
 
+# Requete construite une seule fois et executee en executemany par batch
+_UPDATE_PFHT_SQL = text("UPDATE catalogue_produits SET prix_fabricant = :pfht WHERE code_cip = :cip")
+BATCH_SIZE = 500
+
 
 def parse_pfht_from_bdpm(filepath: Path) -> dict:
     """
@@ -74,17 +78,15 @@ def update_catalogues_pfht():
             print("Aucun CIP a mettre a jour.")
             return
 
-        # Mettre a jour par batch
+        # Mettre a jour par batch (un executemany par batch au lieu d'un execute par CIP)
+        params = [{"pfht": cip_to_pfht[cip], "cip": cip} for cip in cips_to_update]
         updated = 0
-        for cip in cips_to_update:
-            pfht = cip_to_pfht[cip]
-            db.execute(
-                text("UPDATE catalogue_produits SET prix_fabricant = :pfht WHERE code_cip = :cip"),
-                {"pfht": pfht, "cip": cip}
-            )
-            updated += 1
-
-            if updated % 500 == 0:
+        for start in range(0, len(params), BATCH_SIZE):
+            batch = params[start:start + BATCH_SIZE]
+            db.execute(_UPDATE_PFHT_SQL, batch)
+            updated += len(batch)
+
+            if updated % BATCH_SIZE == 0:
                 print(f"  {updated} / {len(cips_to_update)} mis a jour...")
 
         db.commit()
@@ -1,11 +1,13 @@
-from .simulation import run_simulation, calculate_totaux
+from .simulation import run_simulation, persist_resultats, calculate_totaux
 from .pdf_extraction import extract_catalogue_from_pdf
-from .matching import auto_match_product, find_presentation_candidates
+from .matching import auto_match_product, auto_match_products_bulk, find_presentation_candidates
 
 __all__ = [
     "run_simulation",
+    "persist_resultats",
     "calculate_totaux",
     "extract_catalogue_from_pdf",
     "auto_match_product",
+    "auto_match_products_bulk",
     "find_presentation_candidates",
 ]
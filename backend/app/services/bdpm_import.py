@@ -37,6 +37,12 @@ LAB_PATTERNS = {
 # Liste ordonnée pour la détection (évite conflits de patterns)
 TARGET_LABS = ['BIOGARAN', 'SANDOZ', 'ARROW', 'ZENTIVA', 'VIATRIS']
 
+# Variante (mot entier) -> labo, et rang de priorite de chaque labo.
+# Les variantes sont des mots simples: un \b...\b correspond exactement a un mot \w+.
+LAB_BY_ALIAS = {alias: lab for lab in TARGET_LABS for alias in LAB_PATTERNS[lab]}
+LAB_RANK = {lab: rank for rank, lab in enumerate(TARGET_LABS)}
+WORD_PATTERN = re.compile(r'\w+')
+
 
 def detect_lab_from_name(denomination: str) -> Optional[str]:
     """
@@ -51,16 +57,18 @@ def detect_lab_from_name(denomination: str) -> Optional[str]:
     if not denomination:
         return None
 
-    denom_upper = denomination.upper()
-
-    for lab in TARGET_LABS:
-        for pattern in LAB_PATTERNS[lab]:
-            # Recherche du pattern comme mot entier (pas substring)
-            # Ex: "BGR" ne doit pas matcher "BGRIMALDI"
-            if re.search(rf'\b{re.escape(pattern)}\b', denom_upper):
-                return lab
+    # Une passe de decoupage en mots puis lookup dict par mot (mot entier, pas substring)
+    # Ex: "BGR" ne doit pas matcher "BGRIMALDI"
+    labs = {
+        LAB_BY_ALIAS[word]
+        for word in WORD_PATTERN.findall(denomination.upper())
+        if word in LAB_BY_ALIAS
+    }
+    if not labs:
+        return None
 
-    return None
+    # Ordre de TARGET_LABS en cas de plusieurs labos
+    return min(labs, key=LAB_RANK.__getitem__)
 
 
 @dataclass
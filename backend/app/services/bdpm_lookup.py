@@ -6,7 +6,8 @@ Permet de:
 - Enrichir toutes les ventes d'un import avec les donnees BDPM
 """
 from decimal import Decimal
-from typing import Optional, Tuple
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.models import MesVentes, BdpmEquivalence
@@ -54,9 +55,7 @@ def lookup_bdpm_by_cip(db: Session, cip: str) -> Tuple[Optional[Decimal], Option
     if not cip13:
         return None, None, None
 
-    bdpm = db.query(BdpmEquivalence).filter(
-        BdpmEquivalence.cip13 == cip13
-    ).first()
+    bdpm = db.get(BdpmEquivalence, cip13)
 
     if bdpm:
         return bdpm.pfht, bdpm.groupe_generique_id, bdpm.libelle_groupe
@@ -64,6 +63,42 @@ def lookup_bdpm_by_cip(db: Session, cip: str) -> Tuple[Optional[Decimal], Option
     return None, None, None
 
 
+def lookup_bdpm_by_cips(
+    db: Session,
+    cips: Iterable[str],
+    chunk_size: int = 5000
+) -> Dict[str, Tuple[Optional[Decimal], Optional[int], Optional[str]]]:
+    """
+    Version batch de lookup_bdpm_by_cip: une requete IN par paquet de CIP13.
+
+    Args:
+        db: Session SQLAlchemy
+        cips: Codes CIP (normalises en CIP13)
+        chunk_size: Nombre de CIP13 par requete
+
+    Returns:
+        dict cip13 -> (prix_bdpm, groupe_generique_id, libelle_groupe)
+        Les CIP absents de la BDPM ne sont pas dans le dict
+    """
+    cip13s = list({c for c in (normalize_cip(cip) for cip in cips) if c})
+    result = {}
+
+    for i in range(0, len(cip13s), chunk_size):
+        rows = db.query(
+            BdpmEquivalence.cip13,
+            BdpmEquivalence.pfht,
+            BdpmEquivalence.groupe_generique_id,
+            BdpmEquivalence.libelle_groupe
+        ).filter(
+            BdpmEquivalence.cip13.in_(cip13s[i:i + chunk_size])
+        ).all()
+
+        for row in rows:
+            result[row.cip13] = (row.pfht, row.groupe_generique_id, row.libelle_groupe)
+
+    return result
+
+
 def enrich_ventes_with_bdpm(db: Session, import_id: int) -> dict:
     """
     Enrichit toutes les ventes d'un import avec les donnees BDPM.
@@ -101,10 +136,17 @@ def enrich_ventes_with_bdpm(db: Session, import_id: int) -> dict:
     )
     metrics.start(import_id=import_id)
 
+    # Prefetch de toutes les infos BDPM de l'import (evite un SELECT par vente)
+    bdpm_by_cip = lookup_bdpm_by_cips(
+        db, [v.code_cip_achete for v in ventes if v.code_cip_achete]
+    )
+
     for vente in ventes:
         try:
             if vente.code_cip_achete:
-                prix_bdpm, groupe_id, _ = lookup_bdpm_by_cip(db, vente.code_cip_achete)
+                prix_bdpm, groupe_id, _ = bdpm_by_cip.get(
+                    normalize_cip(vente.code_cip_achete), (None, None, None)
+                )
 
                 if prix_bdpm is not None:
                     vente.prix_bdpm = prix_bdpm
@@ -165,15 +207,49 @@ def delete_incomplete_ventes(db: Session, import_id: int) -> int:
 # ENRICHISSEMENT CATALOGUES
 # =====================
 
+# CIP normalise en SQL comme normalize_cip: chiffres uniquement,
+# padding a gauche a 13 chiffres, puis les 13 derniers
+_ENRICH_CATALOGUE_SQL = text("""
+    UPDATE catalogue_produits AS cp
+    SET prix_fabricant = be.pfht,
+        groupe_generique_id = COALESCE(cp.groupe_generique_id, NULLIF(be.groupe_generique_id, 0)),
+        libelle_groupe = COALESCE(cp.libelle_groupe, NULLIF(be.libelle_groupe, ''))
+    FROM bdpm_equivalences AS be
+    WHERE cp.laboratoire_id = :laboratoire_id
+      AND cp.prix_fabricant IS NULL
+      AND cp.code_cip IS NOT NULL
+      AND be.pfht IS NOT NULL
+      AND be.cip13 = right(
+          lpad(
+              regexp_replace(cp.code_cip, '[^0-9]', '', 'g'),
+              greatest(length(regexp_replace(cp.code_cip, '[^0-9]', '', 'g')), 13),
+              '0'
+          ),
+          13
+      )
+""")
+
+# Compteurs du catalogue avant enrichissement (execute une fois par labo)
+_CATALOGUE_COUNTS_SQL = text("""
+    SELECT COUNT(*) AS total,
+           COUNT(prix_fabricant) AS already_has_price
+    FROM catalogue_produits
+    WHERE laboratoire_id = :laboratoire_id
+""")
+
+
 def enrich_catalogue_with_bdpm(db: Session, laboratoire_id: int) -> dict:
     """
     Enrichit tous les produits d'un catalogue avec les prix BDPM.
 
-    Pour chaque produit du catalogue:
+    Pour chaque produit du catalogue sans prix_fabricant:
     - Lookup prix BDPM via CIP13 dans BdpmEquivalence
     - Met a jour prix_fabricant avec le pfht BDPM
     - Met a jour groupe_generique_id et libelle_groupe si non definis
 
+    Tout est fait en une seule requete UPDATE ... FROM (jointure sur le CIP
+    normalise en SQL, meme regle que normalize_cip) au lieu d'un lookup par produit.
+
     Args:
         db: Session SQLAlchemy
         laboratoire_id: ID du laboratoire dont enrichir le catalogue
@@ -181,52 +257,31 @@ def enrich_catalogue_with_bdpm(db: Session, laboratoire_id: int) -> dict:
     Returns:
         dict avec stats: {total, enriched, already_has_price, missing, errors}
     """
-    from app.models import CatalogueProduit
-
-    produits = db.query(CatalogueProduit).filter(
-        CatalogueProduit.laboratoire_id == laboratoire_id
-    ).all()
+    counts = db.execute(_CATALOGUE_COUNTS_SQL, {"laboratoire_id": laboratoire_id}).one()
 
     stats = {
-        "total": len(produits),
+        "total": counts.total,
         "enriched": 0,
-        "already_has_price": 0,
+        "already_has_price": counts.already_has_price,
         "missing": 0,
         "errors": 0
     }
 
-    if not produits:
+    if not stats["total"]:
         return stats
 
-    for produit in produits:
-        try:
-            # Skip si deja un prix_fabricant
-            if produit.prix_fabricant is not None:
-                stats["already_has_price"] += 1
-                continue
-
-            if produit.code_cip:
-                prix_bdpm, groupe_id, libelle = lookup_bdpm_by_cip(db, produit.code_cip)
-
-                if prix_bdpm is not None:
-                    produit.prix_fabricant = prix_bdpm
-                    stats["enriched"] += 1
-
-                    # Mettre a jour groupe si non defini
-                    if produit.groupe_generique_id is None and groupe_id:
-                        produit.groupe_generique_id = groupe_id
-                    if produit.libelle_groupe is None and libelle:
-                        produit.libelle_groupe = libelle
-                else:
-                    stats["missing"] += 1
-            else:
-                stats["missing"] += 1
+    try:
+        result = db.execute(_ENRICH_CATALOGUE_SQL, {"laboratoire_id": laboratoire_id})
+        stats["enriched"] = result.rowcount
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        import_ventes_logger.error(f"Erreur enrichissement catalogue labo {laboratoire_id}: {e}")
+        stats["errors"] = stats["total"] - stats["already_has_price"]
+        return stats
 
-        except Exception as e:
-            import_ventes_logger.error(f"Erreur enrichissement produit {produit.id}: {e}")
-            stats["errors"] += 1
+    stats["missing"] = stats["total"] - stats["already_has_price"] - stats["enriched"]
 
-    db.commit()
     import_ventes_logger.info(
         f"Enrichissement catalogue labo {laboratoire_id}: "
         f"{stats['enriched']} enrichis, {stats['already_has_price']} deja avec prix, "
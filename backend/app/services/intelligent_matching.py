@@ -6,26 +6,44 @@ Inspire de l'algorithme PMC3243188 (Clinical Drug Name Matching).
 """
 import re
 import logging
-from typing import List, Dict, Optional, Tuple
+from collections import defaultdict
+from typing import List, Dict, Optional, Sequence, Tuple
 from dataclasses import dataclass, field
+from functools import lru_cache
 from decimal import Decimal
 
+import numpy as np
 from rapidfuzz import fuzz, process, utils
-from cachetools import TTLCache
+from cachetools import LRUCache, TTLCache
+from sqlalchemy import String, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Session
 
 from app.models import CatalogueProduit, Laboratoire, MesVentes, BdpmEquivalence
 
 logger = logging.getLogger(__name__)
 
+# Colonnes catalogue utilisees par le matching: charger des Row legeres
+# plutot que des instances ORM completes (pas d'identity map ni de lazy loading)
+_PRODUIT_COLUMNS = (
+    CatalogueProduit.id,
+    CatalogueProduit.laboratoire_id,
+    CatalogueProduit.code_cip,
+    CatalogueProduit.nom_commercial,
+    CatalogueProduit.libelle_groupe,
+    CatalogueProduit.groupe_generique_id,
+    CatalogueProduit.prix_fabricant,
+    CatalogueProduit.remise_pct,
+)
+
 
 # =============================================================================
 # DATA CLASSES
 # =============================================================================
 
-@dataclass
+@dataclass(frozen=True)
 class MoleculeComponents:
-    """Composants extraits d'une designation de medicament."""
+    """Composants extraits d'une designation de medicament (immuable, partage par le cache)."""
     molecule: str = ""
     dosage: Optional[str] = None
     forme: Optional[str] = None
@@ -124,138 +142,61 @@ class MoleculeExtractor:
     }
 
     # Pattern pour dosage
+    # re.ASCII: \d et \s sur des plages ASCII simples (libelles ASCII), le litteral µ reste reconnu
     DOSAGE_PATTERN = re.compile(
         r'(\d+[\d,\.]*\s*(?:mg|g|ml|%|microgrammes?|mcg|ui|mmol|µg)(?:/\s*\d+\s*(?:ml|g|dose))?)',
-        re.IGNORECASE
+        re.IGNORECASE | re.ASCII
     )
 
     # Pattern pour conditionnement
     CONDITIONNEMENT_PATTERN = re.compile(
         r'[Bb]/?\s*(\d+)|(?:bt|bte|boite|plq)?\s*(?:de\s+)?(\d+)\s*(?:cpr|cp|gel|caps|comp)',
-        re.IGNORECASE
+        re.IGNORECASE | re.ASCII
+    )
+
+    # Toutes les formes en une seule alternation (un seul scan du texte au lieu
+    # d'un re.search par forme). FORME_RANK conserve la priorite de FORMES_MAPPING.
+    FORME_PATTERN = re.compile(r'\b(?:' + '|'.join(map(re.escape, FORMES_MAPPING)) + r')\b')
+    FORME_RANK = {abbr: rank for rank, abbr in enumerate(FORMES_MAPPING)}
+
+    # Forme d'un libelle BDPM: abreviation ou forme complete en sous-chaine.
+    # Une seule passe: le lookahead teste chaque position, l'alternation triee par
+    # priorite (ordre de FORMES_MAPPING) donne la forme la plus prioritaire a cette position.
+    # (parcours inverse: le rang retenu pour une chaine est celui de sa premiere occurrence)
+    LIBELLE_FORME_RANK = {
+        text: rank
+        for rank, (abbr, full) in reversed(list(enumerate(FORMES_MAPPING.items())))
+        for text in (full, abbr)
+    }
+    LIBELLE_FORME_PATTERN = re.compile(
+        '(?=(' + '|'.join(map(re.escape, sorted(LIBELLE_FORME_RANK, key=LIBELLE_FORME_RANK.__getitem__))) + '))'
     )
+    LIBELLE_FORMES = tuple(FORMES_MAPPING.values())
+
+    NON_WORD_PATTERN = re.compile(r'[^\w]')
+    WHITESPACE_PATTERN = re.compile(r'\s+')
 
     def extract_from_libelle_groupe(self, libelle: str) -> MoleculeComponents:
         """
-        Extrait les composants depuis un libelle_groupe BDPM.
+        Extrait les composants depuis un libelle_groupe BDPM (memoise par libelle).
 
         Format: "MOLECULE DOSAGE - PRINCEPS DOSAGE, forme"
         Exemple: "RAMIPRIL 10 mg - TRIATEC 10 mg, comprime"
         """
-        if not libelle:
-            return MoleculeComponents(raw_text=libelle or "")
-
-        result = MoleculeComponents(raw_text=libelle)
-
-        # Split sur " - " pour separer generique/princeps
-        parts = libelle.split(' - ')
-        generic_part = parts[0].strip()
-        princeps_part = parts[1].strip() if len(parts) > 1 else None
-
-        # Extraire la forme (apres la derniere virgule)
-        if ',' in libelle:
-            forme_text = libelle.rsplit(',', 1)[1].strip().lower()
-            # Chercher une forme connue
-            for abbr, full in self.FORMES_MAPPING.items():
-                if abbr in forme_text or full in forme_text:
-                    result.forme = full
-                    break
-            if not result.forme:
-                result.forme = forme_text
-
-        # Extraire le dosage du generic_part
-        dosage_match = self.DOSAGE_PATTERN.search(generic_part)
-        if dosage_match:
-            result.dosage = self._normalize_dosage(dosage_match.group(1))
-
-        # Molecule = ce qui reste apres avoir enleve le dosage
-        molecule_text = self.DOSAGE_PATTERN.sub('', generic_part).strip()
-        molecule_text = re.sub(r'\s+', ' ', molecule_text)
-        result.molecule = molecule_text.upper()
-
-        # Extraire le princeps
-        if princeps_part:
-            princeps_clean = princeps_part.split(',')[0]
-            princeps_clean = self.DOSAGE_PATTERN.sub('', princeps_clean).strip()
-            result.princeps = princeps_clean
-
-        return result
+        return _extract_from_libelle_groupe(libelle)
 
     def extract_from_commercial_name(self, name: str) -> MoleculeComponents:
         """
-        Extrait les composants depuis un nom commercial.
+        Extrait les composants depuis un nom commercial (memoise par nom).
 
         Format: "MOLECULE LABO DOSAGEmg Forme B/QTE"
         Exemple: "FUROSEMIDE VIATRIS 40mg Cpr B/30"
         """
-        if not name:
-            return MoleculeComponents(raw_text=name or "")
-
-        result = MoleculeComponents(raw_text=name)
-        text = name.strip()
-
-        # Extraire le dosage
-        dosage_match = self.DOSAGE_PATTERN.search(text)
-        if dosage_match:
-            result.dosage = self._normalize_dosage(dosage_match.group(1))
-
-        # Extraire le conditionnement
-        cond_match = self.CONDITIONNEMENT_PATTERN.search(text)
-        if cond_match:
-            cond_str = cond_match.group(1) or cond_match.group(2)
-            if cond_str:
-                try:
-                    result.conditionnement = int(cond_str)
-                except ValueError:
-                    pass
-
-        # Extraire la forme
-        text_lower = text.lower()
-        for abbr, full in self.FORMES_MAPPING.items():
-            if re.search(rf'\b{re.escape(abbr)}\b', text_lower):
-                result.forme = full
-                break
-
-        # Extraire la molecule (mots significatifs avant le dosage)
-        words = text.split()
-        molecule_parts = []
-
-        for word in words:
-            word_clean = re.sub(r'[^\w]', '', word).lower()
-
-            # Arreter si on atteint un chiffre (debut du dosage)
-            if re.match(r'^\d', word_clean):
-                break
-
-            # Ignorer les labos et mots courts
-            if word_clean in self.LABOS_CONNUS:
-                continue
-            if len(word_clean) <= 2:
-                continue
-
-            # Ignorer les formes
-            if word_clean in self.FORMES_MAPPING:
-                continue
-
-            molecule_parts.append(word_clean.upper())
-
-            # Generalement 1-2 mots pour la molecule
-            if len(molecule_parts) >= 2:
-                break
-
-        result.molecule = ' '.join(molecule_parts)
-
-        return result
+        return _extract_from_commercial_name(name)
 
     def _normalize_dosage(self, dosage: str) -> str:
         """Normalise un dosage (enleve espaces, standardise)."""
-        if not dosage:
-            return ""
-        # Enlever espaces internes
-        normalized = re.sub(r'\s+', '', dosage.lower())
-        # Remplacer virgule par point
-        normalized = normalized.replace(',', '.')
-        return normalized
+        return _normalize_dosage(dosage)
 
     def extract(self, text: str) -> MoleculeComponents:
         """
@@ -282,6 +223,144 @@ class MoleculeExtractor:
             return self.extract_from_commercial_name(text)
 
 
+def _normalize_dosage(dosage: str) -> str:
+    """Normalise un dosage (enleve espaces, standardise)."""
+    if not dosage:
+        return ""
+    # Enlever espaces internes
+    normalized = MoleculeExtractor.WHITESPACE_PATTERN.sub('', dosage.lower())
+    # Remplacer virgule par point
+    normalized = normalized.replace(',', '.')
+    return normalized
+
+
+# Extractions memoisees au niveau module, cle = la chaine seule (pas d'instance
+# retenue par le cache). MoleculeComponents est gele: le resultat partage
+# entre appelants ne peut pas etre modifie.
+
+@lru_cache(maxsize=200_000)
+def _extract_from_libelle_groupe(libelle: str) -> MoleculeComponents:
+    """Implementation de MoleculeExtractor.extract_from_libelle_groupe."""
+    if not libelle:
+        return MoleculeComponents(raw_text=libelle or "")
+
+    ext = MoleculeExtractor
+    forme = None
+    dosage = None
+    princeps = None
+
+    # Split sur " - " pour separer generique/princeps
+    parts = libelle.split(' - ')
+    generic_part = parts[0].strip()
+    princeps_part = parts[1].strip() if len(parts) > 1 else None
+
+    # Extraire la forme (apres la derniere virgule)
+    if ',' in libelle:
+        forme_text = libelle.rsplit(',', 1)[1].strip().lower()
+        # Chercher une forme connue (la plus prioritaire presente)
+        formes_trouvees = ext.LIBELLE_FORME_PATTERN.findall(forme_text)
+        if formes_trouvees:
+            rank = min(map(ext.LIBELLE_FORME_RANK.__getitem__, formes_trouvees))
+            forme = ext.LIBELLE_FORMES[rank]
+        else:
+            forme = forme_text
+
+    # Extraire le dosage du generic_part
+    dosage_match = ext.DOSAGE_PATTERN.search(generic_part)
+    if dosage_match:
+        dosage = _normalize_dosage(dosage_match.group(1))
+
+    # Molecule = ce qui reste apres avoir enleve le dosage
+    molecule_text = ext.DOSAGE_PATTERN.sub('', generic_part).strip()
+    molecule_text = ext.WHITESPACE_PATTERN.sub(' ', molecule_text)
+
+    # Extraire le princeps
+    if princeps_part:
+        princeps_clean = princeps_part.split(',')[0]
+        princeps = ext.DOSAGE_PATTERN.sub('', princeps_clean).strip()
+
+    return MoleculeComponents(
+        molecule=molecule_text.upper(),
+        dosage=dosage,
+        forme=forme,
+        princeps=princeps,
+        raw_text=libelle,
+    )
+
+
+@lru_cache(maxsize=200_000)
+def _extract_from_commercial_name(name: str) -> MoleculeComponents:
+    """Implementation de MoleculeExtractor.extract_from_commercial_name."""
+    if not name:
+        return MoleculeComponents(raw_text=name or "")
+
+    ext = MoleculeExtractor
+    text = name.strip()
+    dosage = None
+    conditionnement = None
+    forme = None
+
+    # Extraire le dosage
+    dosage_match = ext.DOSAGE_PATTERN.search(text)
+    if dosage_match:
+        dosage = _normalize_dosage(dosage_match.group(1))
+
+    # Extraire le conditionnement
+    cond_match = ext.CONDITIONNEMENT_PATTERN.search(text)
+    if cond_match:
+        cond_str = cond_match.group(1) or cond_match.group(2)
+        if cond_str:
+            try:
+                conditionnement = int(cond_str)
+            except ValueError:
+                pass
+
+    # Extraire la forme
+    formes_trouvees = ext.FORME_PATTERN.findall(text.lower())
+    if formes_trouvees:
+        abbr = min(formes_trouvees, key=ext.FORME_RANK.__getitem__)
+        forme = ext.FORMES_MAPPING[abbr]
+
+    # Extraire la molecule (mots significatifs avant le dosage)
+    words = text.split()
+    molecule_parts = []
+
+    for word in words:
+        word_clean = ext.NON_WORD_PATTERN.sub('', word).lower()
+
+        # Arreter si on atteint un chiffre (debut du dosage)
+        if word_clean[:1].isdecimal():
+            break
+
+        # Ignorer les labos et mots courts
+        if word_clean in ext.LABOS_CONNUS:
+            continue
+        if len(word_clean) <= 2:
+            continue
+
+        # Ignorer les formes
+        if word_clean in ext.FORMES_MAPPING:
+            continue
+
+        molecule_parts.append(word_clean.upper())
+
+        # Generalement 1-2 mots pour la molecule
+        if len(molecule_parts) >= 2:
+            break
+
+    return MoleculeComponents(
+        molecule=' '.join(molecule_parts),
+        dosage=dosage,
+        forme=forme,
+        conditionnement=conditionnement,
+        raw_text=name,
+    )
+
+
+# Extracteur partage (sans etat): a utiliser plutot qu'une nouvelle instance par requete
+_extractor = MoleculeExtractor()
+
+
 # =============================================================================
 # FUZZY MATCHER
 # =============================================================================
@@ -316,6 +395,56 @@ class FuzzyMatcher:
             score_cutoff=self.score_cutoff
         )
 
+    def match_molecules_batch(
+        self,
+        queries: List[str],
+        choices: Tuple[str, ...],
+        limit: int = 5,
+        chunk_size: int = 1000
+    ) -> List[List[Tuple[str, float, int]]]:
+        """
+        Equivalent de match_molecule pour plusieurs requetes a la fois.
+
+        Une matrice de scores (requetes x choix) par paquet de chunk_size requetes,
+        calculee par RapidFuzz en C sur tous les coeurs (cdist), au lieu d'un
+        process.extract par requete. Meme scorer, meme cutoff et meme ordre
+        (score decroissant, puis ordre des choix) que match_molecule.
+
+        Le top-limit est extrait pour tout le paquet en une passe numpy
+        (tri + gather); seuls les resultats retenus sont convertis en tuples.
+        """
+        results = []
+        if not choices:
+            return [[] for _ in queries]
+
+        choices_arr = np.array(choices, dtype=object)
+        limit = min(limit, len(choices))
+
+        for start in range(0, len(queries), chunk_size):
+            scores = process.cdist(
+                queries[start:start + chunk_size],
+                choices,
+                scorer=fuzz.WRatio,
+                processor=utils.default_process,
+                score_cutoff=self.score_cutoff,
+                workers=-1
+            )
+            top_idx = np.argsort(-scores, axis=1, kind='stable')[:, :limit]
+            top_scores = np.take_along_axis(scores, top_idx, axis=1)
+            keep = top_scores >= self.score_cutoff
+            top_choices = choices_arr[top_idx]
+
+            for names, row_scores, row_idx, row_keep in zip(
+                top_choices.tolist(), top_scores.tolist(), top_idx.tolist(), keep.tolist()
+            ):
+                results.append([
+                    (name, score, i)
+                    for name, score, i, ok in zip(names, row_scores, row_idx, row_keep)
+                    if ok
+                ])
+
+        return results
+
     def match_commercial_name(
         self,
         query: str,
@@ -409,26 +538,34 @@ class IntelligentMatcher:
 
     def __init__(self, db: Session):
         self.db = db
-        self.extractor = MoleculeExtractor()
+        self.extractor = _extractor
         self.fuzzy = FuzzyMatcher(score_cutoff=60.0)
         self._cache = TTLCache(maxsize=1000, ttl=300)  # Cache 5 min
 
-    def _get_all_products_by_lab(self) -> Dict[int, List[CatalogueProduit]]:
-        """Recupere tous les produits groupes par labo (cache)."""
-        cache_key = "all_products_by_lab"
+    def _get_active_products(self) -> List[CatalogueProduit]:
+        """Recupere tous les produits actifs (cache, charge une seule fois)."""
+        cache_key = "active_products"
         if cache_key in self._cache:
             return self._cache[cache_key]
 
-        products = self.db.query(CatalogueProduit).filter(
+        result = self.db.query(*_PRODUIT_COLUMNS).filter(
             CatalogueProduit.actif == True
         ).all()
 
-        result = {}
-        for p in products:
-            if p.laboratoire_id not in result:
-                result[p.laboratoire_id] = []
+        self._cache[cache_key] = result
+        return result
+
+    def _get_all_products_by_lab(self) -> Dict[int, List[CatalogueProduit]]:
+        """Recupere tous les produits groupes par labo (cache)."""
+        cache_key = "all_products_by_lab"
+        if cache_key in self._cache:
+            return self._cache[cache_key]
+
+        result = defaultdict(list)
+        for p in self._get_active_products():
             result[p.laboratoire_id].append(p)
 
+        result = dict(result)
         self._cache[cache_key] = result
         return result
 
@@ -449,19 +586,17 @@ class IntelligentMatcher:
         if cache_key in self._cache:
             return self._cache[cache_key]
 
-        products = self.db.query(CatalogueProduit).filter(
+        products = self.db.query(*_PRODUIT_COLUMNS).filter(
             CatalogueProduit.actif == True,
             CatalogueProduit.code_cip.isnot(None)
         ).all()
 
-        result = {}
+        result = defaultdict(list)
         for p in products:
             if p.code_cip:
-                cip = p.code_cip.strip()
-                if cip not in result:
-                    result[cip] = []
-                result[cip].append(p)
+                result[p.code_cip.strip()].append(p)
 
+        result = dict(result)
         self._cache[cache_key] = result
         return result
 
@@ -471,54 +606,184 @@ class IntelligentMatcher:
         if cache_key in self._cache:
             return self._cache[cache_key]
 
-        products = self.db.query(CatalogueProduit).filter(
+        products = self.db.query(*_PRODUIT_COLUMNS).filter(
             CatalogueProduit.actif == True,
             CatalogueProduit.groupe_generique_id.isnot(None)
         ).all()
 
-        result = {}
+        result = defaultdict(list)
         for p in products:
-            gid = p.groupe_generique_id
-            if gid not in result:
-                result[gid] = []
-            result[gid].append(p)
+            result[p.groupe_generique_id].append(p)
 
+        result = dict(result)
         self._cache[cache_key] = result
         return result
 
-    def _lookup_groupe_from_bdpm(self, cip: str) -> Optional[Tuple[int, str]]:
+    def _get_molecule_index(
+        self,
+        target_lab_id: Optional[int] = None
+    ) -> Dict[str, List[Tuple[CatalogueProduit, MoleculeComponents]]]:
         """
-        Lookup groupe_generique_id depuis la table BDPM.
+        Index molecule -> [(produit, composants)] pour le fuzzy matching (cache).
 
-        Permet de trouver le groupe meme si le produit vient d'un labo
-        non importe dans le systeme (BIOGARAN, TEVA, EG, etc.)
+        L'extraction des composants de chaque produit du catalogue est faite
+        une seule fois par labo cible et non a chaque produit recherche.
+        """
+        cache_key = f"molecule_index_{target_lab_id or 'all'}"
+        if cache_key in self._cache:
+            return self._cache[cache_key]
 
-        Returns:
-            Tuple (groupe_generique_id, libelle_groupe) ou None
+        result = defaultdict(list)
+        for p in self._get_active_products():
+            if target_lab_id and p.laboratoire_id != target_lab_id:
+                continue
+
+            if p.libelle_groupe:
+                target_comp = self.extractor.extract_from_libelle_groupe(p.libelle_groupe)
+            else:
+                target_comp = self.extractor.extract_from_commercial_name(p.nom_commercial or "")
+
+            if target_comp.molecule:
+                result[target_comp.molecule.upper()].append((p, target_comp))
+
+        result = dict(result)
+        self._cache[cache_key] = result
+        return result
+
+    def _get_molecule_choices(self, target_lab_id: Optional[int] = None) -> Tuple[str, ...]:
+        """Cles de l'index molecule sous forme de tuple, pretes pour RapidFuzz (cache)."""
+        cache_key = f"molecule_choices_{target_lab_id or 'all'}"
+        if cache_key in self._cache:
+            return self._cache[cache_key]
+
+        result = tuple(self._get_molecule_index(target_lab_id).keys())
+        self._cache[cache_key] = result
+        return result
+
+    def _get_commercial_names(
+        self,
+        target_lab_id: Optional[int] = None
+    ) -> Tuple[Tuple[CatalogueProduit, ...], Tuple[str, ...]]:
         """
-        if not cip:
-            return None
+        Produits ayant un nom commercial et leurs noms, en tuples paralleles (cache).
 
-        cache_key = f"bdpm_lookup_{cip}"
+        Les choix passes a RapidFuzz sont prepares une seule fois par labo cible;
+        l'indice retourne par le fuzzy donne directement le produit.
+        """
+        cache_key = f"commercial_names_{target_lab_id or 'all'}"
         if cache_key in self._cache:
             return self._cache[cache_key]
 
-        # Nettoyer le CIP (garder les 13 derniers chiffres)
+        products = tuple(
+            p for p in self._get_active_products()
+            if (not target_lab_id or p.laboratoire_id == target_lab_id)
+            and p.nom_commercial
+        )
+        result = (products, tuple(p.nom_commercial for p in products))
+        self._cache[cache_key] = result
+        return result
+
+    def _get_query_components(self, designation: str) -> MoleculeComponents:
+        """Composants extraits d'une designation recherchee (memoises par l'extracteur)."""
+        return self.extractor.extract_from_commercial_name(designation)
+
+    def _get_molecule_matches(self, target_lab_id: Optional[int] = None) -> Dict[str, List[Tuple[str, float, int]]]:
+        """Cache molecule recherchee -> resultats fuzzy sur les molecules du labo cible."""
+        cache_key = f"molecule_matches_{target_lab_id or 'all'}"
+        if cache_key not in self._cache:
+            self._cache[cache_key] = {}
+        return self._cache[cache_key]
+
+    def prefetch_molecule_matches(
+        self,
+        designations: List[str],
+        target_lab_ids: Sequence[Optional[int]] = (None,)
+    ) -> None:
+        """
+        Calcule en lot (une matrice cdist par labo cible) le fuzzy molecule
+        de toutes les designations, pour eviter un process.extract par produit.
+        """
+        molecules = {
+            comp.molecule
+            for designation in designations
+            if (comp := self._get_query_components(designation)).molecule
+        }
+        if not molecules:
+            return
+
+        for target_lab_id in target_lab_ids:
+            molecule_matches = self._get_molecule_matches(target_lab_id)
+            to_match = [m for m in molecules if m not in molecule_matches]
+            if not to_match:
+                continue
+
+            choices = self._get_molecule_choices(target_lab_id)
+            batch = self.fuzzy.match_molecules_batch(to_match, choices, limit=10)
+            molecule_matches.update(zip(to_match, batch))
+
+    @staticmethod
+    def _clean_cip(cip: str) -> str:
+        """Nettoie un CIP (garder les 13 derniers chiffres)."""
         cip_clean = ''.join(c for c in cip if c.isdigit())
         if len(cip_clean) > 13:
             cip_clean = cip_clean[-13:]
+        return cip_clean
 
-        bdpm = self.db.query(BdpmEquivalence).filter(
-            BdpmEquivalence.cip13 == cip_clean
-        ).first()
+    def _get_bdpm_groupes(self) -> Dict[str, Optional[Tuple[int, str]]]:
+        """
+        Cache cip13 -> (groupe_generique_id, libelle_groupe) ou None.
 
-        if bdpm and bdpm.groupe_generique_id:
-            result = (bdpm.groupe_generique_id, bdpm.libelle_groupe)
-        else:
-            result = None
+        None memorise un CIP absent de la BDPM (cache negatif: pas de nouvelle
+        requete). LRU borne pour que la memoire ne croisse pas avec les imports.
+        """
+        cache_key = "bdpm_groupes"
+        if cache_key not in self._cache:
+            self._cache[cache_key] = LRUCache(maxsize=100_000)
+        return self._cache[cache_key]
 
-        self._cache[cache_key] = result
-        return result
+    def prefetch_bdpm_groupes(self, cips: List[Optional[str]]) -> None:
+        """
+        Charge en une seule requete (cip13 = ANY(:cips)) les groupes BDPM
+        d'une liste de CIP, pour eviter un lookup par produit.
+        """
+        bdpm_groupes = self._get_bdpm_groupes()
+        to_fetch = {self._clean_cip(cip) for cip in cips if cip} - bdpm_groupes.keys()
+        if not to_fetch:
+            return
+
+        rows = self.db.query(
+            BdpmEquivalence.cip13,
+            BdpmEquivalence.groupe_generique_id,
+            BdpmEquivalence.libelle_groupe
+        ).filter(
+            BdpmEquivalence.cip13 == any_(bindparam("cips", list(to_fetch), type_=ARRAY(String)))
+        ).all()
+
+        for cip13 in to_fetch:
+            bdpm_groupes[cip13] = None
+        for row in rows:
+            if row.groupe_generique_id:
+                bdpm_groupes[row.cip13] = (row.groupe_generique_id, row.libelle_groupe)
+
+    def _lookup_groupe_from_bdpm(self, cip: str) -> Optional[Tuple[int, str]]:
+        """
+        Lookup groupe_generique_id depuis la table BDPM.
+
+        Permet de trouver le groupe meme si le produit vient d'un labo
+        non importe dans le systeme (BIOGARAN, TEVA, EG, etc.)
+
+        Returns:
+            Tuple (groupe_generique_id, libelle_groupe) ou None
+        """
+        if not cip:
+            return None
+
+        cip_clean = self._clean_cip(cip)
+        bdpm_groupes = self._get_bdpm_groupes()
+        if cip_clean not in bdpm_groupes:
+            self.prefetch_bdpm_groupes([cip_clean])
+
+        return bdpm_groupes.get(cip_clean)
 
     def find_matches_for_product(
         self,
@@ -602,40 +867,26 @@ class IntelligentMatcher:
         if results:
             return sorted(results, key=lambda x: (-x.score, x.laboratoire_nom))
 
-        # 3. Extraire les composants de la designation pour fuzzy matching
-        query_components = self.extractor.extract_from_commercial_name(designation)
+        # 3. Extraire les composants de la designation pour fuzzy matching (cache)
+        query_components = self._get_query_components(designation)
 
         # 4. Chercher par fuzzy matching sur molecule
-        products_by_groupe = self._get_products_by_groupe()
-        all_products = self.db.query(CatalogueProduit).filter(
-            CatalogueProduit.actif == True
-        ).all()
-
-        # Construire un index molecule -> produits pour le fuzzy matching
-        molecule_to_products = {}
-        for p in all_products:
-            if target_lab_id and p.laboratoire_id != target_lab_id:
-                continue
-
-            if p.libelle_groupe:
-                target_comp = self.extractor.extract_from_libelle_groupe(p.libelle_groupe)
-            else:
-                target_comp = self.extractor.extract_from_commercial_name(p.nom_commercial or "")
-
-            if target_comp.molecule:
-                mol_key = target_comp.molecule.upper()
-                if mol_key not in molecule_to_products:
-                    molecule_to_products[mol_key] = []
-                molecule_to_products[mol_key].append((p, target_comp))
+        # Index molecule -> produits charge une fois (cache)
+        molecule_to_products = self._get_molecule_index(target_lab_id)
 
         # Fuzzy match sur les molecules
         if query_components.molecule and molecule_to_products:
-            molecule_choices = list(molecule_to_products.keys())
-            fuzzy_matches = self.fuzzy.match_molecule(
-                query_components.molecule,
-                molecule_choices,
-                limit=10
-            )
+            # Resultats precalcules en lot (prefetch_molecule_matches) si disponibles
+            molecule_matches = self._get_molecule_matches(target_lab_id)
+            fuzzy_matches = molecule_matches.get(query_components.molecule)
+            if fuzzy_matches is None:
+                molecule_choices = self._get_molecule_choices(target_lab_id)
+                fuzzy_matches = self.fuzzy.match_molecule(
+                    query_components.molecule,
+                    molecule_choices,
+                    limit=10
+                )
+                molecule_matches[query_components.molecule] = fuzzy_matches
 
             seen_products = set()  # Eviter les doublons
 
@@ -674,14 +925,9 @@ class IntelligentMatcher:
 
         # 4. Fallback: fuzzy sur nom commercial complet
         if not results:
-            all_products_filtered = [
-                p for p in all_products
-                if (not target_lab_id or p.laboratoire_id == target_lab_id)
-                and p.nom_commercial
-            ]
+            all_products_filtered, product_names = self._get_commercial_names(target_lab_id)
 
             if all_products_filtered:
-                product_names = [p.nom_commercial for p in all_products_filtered]
                 fuzzy_matches = self.fuzzy.match_commercial_name(
                     designation,
                     product_names,
@@ -729,6 +975,10 @@ class IntelligentMatcher:
 
         logger.info(f"Matching {len(ventes)} ventes avec {len(labs_map)} labos...")
 
+        # Groupes BDPM de toutes les ventes en une requete, fuzzy molecule en lot
+        self.prefetch_bdpm_groupes([v.code_cip_achete for v in ventes])
+        self.prefetch_molecule_matches([v.designation or "" for v in ventes])
+
         for vente in ventes:
             vente_result = VenteMatchingResult(
                 vente_id=vente.id,
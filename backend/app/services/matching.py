@@ -1,4 +1,6 @@
 import re
+from collections import defaultdict
+from functools import lru_cache
 from typing import List, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
@@ -6,6 +8,17 @@ from sqlalchemy import or_
 from app.models import Presentation, CatalogueProduit
 
 
+# Pattern pour extraire le dosage (ex: 40mg, 20 mg, 500mg/5ml)
+_DOSAGE_RE = re.compile(r'(\d+(?:,\d+)?(?:\s*mg|\s*g|\s*ml|\s*µg|mg/ml|mg/\d+ml))', re.IGNORECASE)
+_STARTS_DIGIT = re.compile(r'^\d').match
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Noms de labos connus a ignorer lors de l'extraction de la molecule
+_LABOS = frozenset({"viatris", "zentiva", "biogaran", "sandoz", "teva", "mylan", "arrow", "eg", "cristers"})
+
+
+@lru_cache(maxsize=100_000)
 def extract_molecule_dosage(designation: str) -> Tuple[Optional[str], Optional[str]]:
     """
     Extrait la molecule et le dosage d'une designation.
@@ -13,30 +26,35 @@ def extract_molecule_dosage(designation: str) -> Tuple[Optional[str], Optional[s
     Exemples:
         "Furosemide Viatris 40mg Cpr B/30" -> ("Furosemide", "40mg")
         "OMEPRAZOLE ZENTIVA 20 mg Gel" -> ("Omeprazole", "20mg")
+
+    Memoisee (fonction pure): les designations se repetent beaucoup entre
+    ventes. Cache par processus, vidable via extract_molecule_dosage.cache_clear().
     """
     # Nettoyer
     text = designation.strip()
 
-    # Pattern pour extraire le dosage (ex: 40mg, 20 mg, 500mg/5ml)
-    dosage_pattern = r'(\d+(?:,\d+)?(?:\s*mg|\s*g|\s*ml|\s*µg|mg/ml|mg/\d+ml))'
-    dosage_match = re.search(dosage_pattern, text, re.IGNORECASE)
+    dosage_match = _DOSAGE_RE.search(text)
     dosage = dosage_match.group(1).replace(" ", "") if dosage_match else None
 
     # Le premier mot est souvent la molecule
     # On enleve les noms de labos connus
-    labos = ["viatris", "zentiva", "biogaran", "sandoz", "teva", "mylan", "arrow", "eg", "cristers"]
     words = text.split()
     molecule = None
 
     for word in words:
         word_clean = word.lower().strip(",").strip(".")
-        if word_clean not in labos and len(word_clean) > 2 and not re.match(r'^\d', word_clean):
+        if word_clean not in _LABOS and len(word_clean) > 2 and not _STARTS_DIGIT(word_clean):
             molecule = word_clean.capitalize()
             break
 
     return molecule, dosage
 
 
+def normalize_dosage(dosage: str) -> str:
+    """Normalise un dosage comme la colonne presentations.dosage_norm ("40 MG" -> "40mg")."""
+    return _WHITESPACE_RE.sub("", dosage).lower()
+
+
 def classify_conditionnement(qty: int) -> str:
     """Classifie un conditionnement en petit ou grand."""
     # Seuil par defaut: 60
@@ -64,20 +82,75 @@ def auto_match_product(
     Returns:
         Tuple[presentation, status] ou status est 'auto', 'ambiguous', 'new'
     """
-    molecule, dosage = extract_molecule_dosage(designation)
+    return auto_match_products_bulk(db, [(designation, conditionnement)])[0]
+
+
+def auto_match_products_bulk(
+    db: Session,
+    rows: List[Tuple[str, Optional[int]]]
+) -> List[Tuple[Optional[Presentation], str]]:
+    """
+    Version batch de auto_match_product: une seule requete pour toutes les designations.
+
+    Les molecules sont extraites en Python, les presentations candidates chargees
+    en une requete puis filtrees en memoire (molecule, dosage, conditionnement)
+    avec les memes regles que find_presentation_candidates.
+
+    Args:
+        rows: Liste de tuples (designation, conditionnement)
+
+    Returns:
+        Liste de Tuple[presentation, status] dans l'ordre des rows
+    """
+    parsed = []
+    for designation, conditionnement in rows:
+        molecule, dosage = extract_molecule_dosage(designation)
+        parsed.append((molecule.lower() if molecule else None, dosage, conditionnement))
+
+    molecules = {molecule for molecule, _, _ in parsed if molecule}
+    if not molecules:
+        return [(None, "new") for _ in parsed]
+
+    presentations = db.query(Presentation).filter(
+        or_(*[Presentation.molecule.ilike(f"%{m}%") for m in molecules])
+    ).all()
+
+    # Index molecule extraite -> presentations dont la molecule la contient
+    candidates_by_molecule = defaultdict(list)
+    for p in presentations:
+        molecule_lower = p.molecule.lower()
+        for m in molecules:
+            if m in molecule_lower:
+                candidates_by_molecule[m].append(p)
+
+    results = []
+    for molecule, dosage, conditionnement in parsed:
+        if not molecule:
+            results.append((None, "new"))
+            continue
+
+        candidates = candidates_by_molecule.get(molecule, [])
+
+        # Filtrer par dosage si disponible (prefixe: "500mg" retient "500mg/5ml")
+        if dosage:
+            dosage_norm = normalize_dosage(dosage)
+            candidates = [p for p in candidates if p.dosage_norm and p.dosage_norm.startswith(dosage_norm)]
+
+        # Filtrer par type de conditionnement si disponible
+        if conditionnement:
+            type_cond = classify_conditionnement(conditionnement)
+            candidates = [p for p in candidates if p.type_conditionnement == type_cond]
 
-    if not molecule:
-        return None, "new"
+        candidates = candidates[:10]
 
-    # Rechercher des presentations candidates
-    candidates = find_presentation_candidates(db, molecule, dosage, conditionnement)
+        if len(candidates) == 1:
+            results.append((candidates[0], "auto"))
+        elif len(candidates) > 1:
+            results.append((candidates[0], "ambiguous"))  # Retourne le premier mais signale l'ambiguite
+        else:
+            results.append((None, "new"))
 
-    if len(candidates) == 1:
-        return candidates[0], "auto"
-    elif len(candidates) > 1:
-        return candidates[0], "ambiguous"  # Retourne le premier mais signale l'ambiguite
-    else:
-        return None, "new"
+    return results
 
 
 def find_presentation_candidates(
@@ -91,19 +164,14 @@ def find_presentation_candidates(
     """
     query = db.query(Presentation)
 
-    # Recherche sur la molecule (fuzzy)
+    # Recherche sur la molecule (fuzzy) - ILIKE servi par l'index GIN trigram (migration 005)
     query = query.filter(Presentation.molecule.ilike(f"%{molecule}%"))
 
-    # Filtrer par dosage si disponible
+    # Filtrer par dosage si disponible: prefixe sur la colonne normalisee,
+    # pour garder les dosages composes ("500mg" retient "500mg/5ml").
+    # LIKE 'x%' servi par l'index text_pattern_ops (migration 008)
     if dosage:
-        # Normaliser le dosage (enlever espaces)
-        dosage_norm = dosage.replace(" ", "").lower()
-        query = query.filter(
-            or_(
-                Presentation.dosage.ilike(f"%{dosage}%"),
-                Presentation.dosage.ilike(f"%{dosage_norm}%"),
-            )
-        )
+        query = query.filter(Presentation.dosage_norm.startswith(normalize_dosage(dosage), autoescape=True))
 
     # Filtrer par type de conditionnement si disponible
     if conditionnement:
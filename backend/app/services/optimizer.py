@@ -1,5 +1,5 @@
 """
-Optimisation multi-labos avec OR-Tools (Google).
+Optimisation multi-labos avec OR-Tools CP-SAT (Google).
 
 Probleme: Repartir les achats entre N labos pour maximiser les remises
 tout en respectant les objectifs minimums par labo.
@@ -14,13 +14,26 @@ Contraintes:
   - Chaque vente achetee chez UN SEUL labo (ou aucun si pas dispo)
   - Chiffre labo_l >= objectif_l (si specifie)
   - Produits exclus du labo l ne peuvent pas etre achetes chez l
+
+Les montants sont passes au solver en centimes entiers (CP-SAT ne travaille
+qu'en entiers).
 """
 
 import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from decimal import Decimal
 from typing import Optional
 from dataclasses import dataclass
-from ortools.linear_solver import pywraplp
+import numpy as np
+from cachetools import TTLCache
+from ortools.sat.python import cp_model
+from sqlalchemy import and_
 from sqlalchemy.orm import Session
 
 from app.models import (
@@ -87,32 +100,41 @@ def get_vente_matching_data(
     Returns:
         (ventes, matching_map, produits_map)
         - ventes: Liste des MesVentes
-        - matching_map: {(vente_id, labo_id): VenteMatching}
+        - matching_map: {(vente_id, labo_id): VenteMatching} (produit_id toujours renseigne)
         - produits_map: {produit_id: CatalogueProduit}
     """
-    # Recuperer les ventes
-    ventes = db.query(MesVentes).filter(MesVentes.import_id == import_id).all()
-
-    if not ventes:
-        return [], {}, {}
-
-    vente_ids = [v.id for v in ventes]
-
-    # Recuperer les matchings pour tous les labos
-    matchings = db.query(VenteMatching).filter(
-        VenteMatching.vente_id.in_(vente_ids),
-        VenteMatching.labo_id.in_(labo_ids)
-    ).all()
-
-    matching_map = {(m.vente_id, m.labo_id): m for m in matchings}
+    # Une seule requete: ventes + matchings des labos + produits (jointures externes
+    # pour garder les ventes sans matching), lue en flux par paquets
+    rows = (
+        db.query(MesVentes, VenteMatching, CatalogueProduit)
+        .outerjoin(
+            VenteMatching,
+            and_(
+                VenteMatching.vente_id == MesVentes.id,
+                VenteMatching.labo_id.in_(labo_ids),
+                # Matchings sans produit inutiles pour l'optimisation: filtres en SQL
+                VenteMatching.produit_id.isnot(None)
+            )
+        )
+        .outerjoin(CatalogueProduit, CatalogueProduit.id == VenteMatching.produit_id)
+        .filter(MesVentes.import_id == import_id)
+        .order_by(MesVentes.id)
+        .yield_per(1000)
+    )
 
-    # Recuperer les produits
-    produit_ids = list(set(m.produit_id for m in matchings if m.produit_id))
-    produits = db.query(CatalogueProduit).filter(
-        CatalogueProduit.id.in_(produit_ids)
-    ).all() if produit_ids else []
+    ventes = []
+    seen_vente_ids = set()
+    matching_map = {}
+    produits_map = {}
 
-    produits_map = {p.id: p for p in produits}
+    for vente, matching, produit in rows:
+        if vente.id not in seen_vente_ids:
+            seen_vente_ids.add(vente.id)
+            ventes.append(vente)
+        if matching is not None:
+            matching_map[(matching.vente_id, matching.labo_id)] = matching
+        if produit is not None:
+            produits_map[produit.id] = produit
 
     return ventes, matching_map, produits_map
 
@@ -144,50 +166,116 @@ def get_exclusions_for_labos(db: Session, labo_ids: list[int]) -> dict:
     return exclusions
 
 
-def calculate_potentiels(
-    ventes: list[MesVentes],
-    matching_map: dict,
-    produits_map: dict,
-    labo_ids: list[int],
-    exclusions: dict
-) -> dict:
+@dataclass
+class ExclusionMatrix:
     """
-    Calcule le potentiel (chiffre max possible) par labo.
+    Exclusions sous forme de matrice booleenne dense produits x labos.
 
-    Returns:
-        {labo_id: potentiel_ht}
+    Construite une seule fois par optimisation: le test d'exclusion dans les
+    boucles chaudes devient un acces indexe au lieu d'un lookup dict + set.
     """
-    potentiels = {lid: Decimal("0") for lid in labo_ids}
+    matrix: np.ndarray  # shape (nb_produits, nb_labos), True = exclu
+    produit_index: dict  # {produit_id: ligne}
+    labo_index: dict  # {labo_id: colonne}
+
+    @classmethod
+    def build(cls, exclusions: dict, produits_map: dict, labo_ids: list[int]) -> "ExclusionMatrix":
+        produit_index = {pid: i for i, pid in enumerate(produits_map)}
+        labo_index = {lid: j for j, lid in enumerate(labo_ids)}
+        matrix = np.zeros((len(produit_index), len(labo_index)), dtype=bool)
+
+        for labo_id, produit_ids in exclusions.items():
+            j = labo_index.get(labo_id)
+            if j is None:
+                continue
+            rows = [produit_index[pid] for pid in produit_ids if pid in produit_index]
+            matrix[rows, j] = True
 
-    for vente in ventes:
-        quantite = vente.quantite_annuelle or 0
-        if quantite <= 0:
-            continue
+        return cls(matrix=matrix, produit_index=produit_index, labo_index=labo_index)
 
-        for labo_id in labo_ids:
-            matching = matching_map.get((vente.id, labo_id))
-            if not matching or not matching.produit_id:
-                continue
 
-            produit = produits_map.get(matching.produit_id)
-            if not produit:
-                continue
+@dataclass
+class _SolverModel:
+    """Modele CP-SAT construit, reutilisable tant que ses coefficients ne changent pas."""
+    model: cp_model.CpModel
+    x: dict  # {(vente_id, labo_id): BoolVar}
+    var_indices: np.ndarray  # Index proto des variables, dans l'ordre de x
+    objectif_constraints: dict  # {labo_id: contrainte chiffre_labo >= objectif}
+    lock: threading.Lock
 
-            # Verifier exclusion
-            if produit.id in exclusions.get(labo_id, set()):
-                continue
 
-            prix = produit.prix_ht or Decimal("0")
-            potentiels[labo_id] += prix * quantite
+# Modeles recents indexes par leurs coefficients (cache 5 min)
+_model_cache = TTLCache(maxsize=8, ttl=300)
+_model_cache_lock = threading.Lock()
 
-    return potentiels
+# Threads CP-SAT par resolution
+CP_SAT_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def _build_solver_model(terms: list[tuple], labo_ids: list[int]) -> _SolverModel:
+    """
+    Construit le modele CP-SAT a partir des coefficients (montants en centimes entiers).
+
+    Les contraintes objectifs sont creees pour tous les labos sans borne basse:
+    optimize_multi_labo ajuste leur domaine avant chaque resolution.
+    """
+    model = cp_model.CpModel()
+
+    # === VARIABLES DE DECISION ===
+    # x[v,l] = 1 si vente v achetee chez labo l
+    x = {}
+
+    # Termes objectif (remise totale) et chiffre par labo (pour contraintes)
+    vars_objectif = []
+    gains_objectif = []
+    vars_chiffre_labo = {lid: [] for lid in labo_ids}
+    montants_chiffre_labo = {lid: [] for lid in labo_ids}
+    vars_par_vente = defaultdict(list)
+
+    for vente_id, labo_id, montant_cents, gain_cents in terms:
+        var = model.NewBoolVar(f"x_{vente_id}_{labo_id}")
+        x[(vente_id, labo_id)] = var
+        vars_par_vente[vente_id].append(var)
+
+        # Coefficient objectif = gain remise
+        vars_objectif.append(var)
+        gains_objectif.append(gain_cents)
+
+        # Contribution au chiffre du labo
+        vars_chiffre_labo[labo_id].append(var)
+        montants_chiffre_labo[labo_id].append(montant_cents)
+
+    # Contrainte: au plus 1 labo par vente
+    for vars_vente in vars_par_vente.values():
+        model.AddAtMostOne(vars_vente)
+
+    # Pas de contrainte pour un labo sans variable (chiffre toujours nul)
+    objectif_constraints = {
+        lid: model.Add(
+            cp_model.LinearExpr.WeightedSum(vars_chiffre_labo[lid], montants_chiffre_labo[lid])
+            >= cp_model.INT_MIN
+        )
+        for lid in labo_ids
+        if vars_chiffre_labo[lid]
+    }
+
+    model.Maximize(cp_model.LinearExpr.WeightedSum(vars_objectif, gains_objectif))
+
+    return _SolverModel(
+        model=model,
+        x=x,
+        var_indices=np.fromiter((var.Index() for var in x.values()), dtype=np.intp, count=len(x)),
+        objectif_constraints=objectif_constraints,
+        lock=threading.Lock()
+    )
 
 
 def optimize_multi_labo(
     db: Session,
     import_id: int,
     objectives: list[LaboObjective],
-    max_time_seconds: int = 30
+    max_time_seconds: int = 30,
+    num_workers: int = CP_SAT_WORKERS
 ) -> OptimizationResult:
     """
     Optimise la repartition des achats entre plusieurs labos.
@@ -197,6 +285,7 @@ def optimize_multi_labo(
         import_id: ID de l'import ventes
         objectives: Liste des objectifs par labo
         max_time_seconds: Temps max pour le solver
+        num_workers: Threads CP-SAT pour cette resolution
 
     Returns:
         OptimizationResult avec la repartition optimale
@@ -205,6 +294,7 @@ def optimize_multi_labo(
 
     # Recuperer les donnees
     ventes, matching_map, produits_map = get_vente_matching_data(db, import_id, labo_ids)
+    ventes_by_id = {v.id: v for v in ventes}
 
     if not ventes:
         return OptimizationResult(
@@ -227,12 +317,11 @@ def optimize_multi_labo(
             exclusions.setdefault(obj.labo_id, set())
             exclusions[obj.labo_id].update(obj.exclusions)
 
-    # Calculer les potentiels
-    potentiels = calculate_potentiels(ventes, matching_map, produits_map, labo_ids, exclusions)
-
-    # Mettre a jour les potentiels dans les objectifs
-    for obj in objectives:
-        obj.potentiel_ht = potentiels.get(obj.labo_id, Decimal("0"))
+    # Matrice dense produits x labos, construite une fois
+    exclusion_matrix = ExclusionMatrix.build(exclusions, produits_map, labo_ids)
+    excluded = exclusion_matrix.matrix
+    produit_index = exclusion_matrix.produit_index
+    labo_index = exclusion_matrix.labo_index
 
     # Recuperer les infos labo pour les remises
     labos = {l.id: l for l in db.query(Laboratoire).filter(Laboratoire.id.in_(labo_ids)).all()}
@@ -242,46 +331,31 @@ def optimize_multi_labo(
             obj.labo_nom = labo.nom
             obj.remise_negociee = labo.remise_negociee or Decimal("0")
 
-    # === CREATION DU SOLVER ===
-    solver = pywraplp.Solver.CreateSolver('SCIP')
-    if not solver:
-        solver = pywraplp.Solver.CreateSolver('CBC')
-    if not solver:
-        return OptimizationResult(
-            success=False,
-            message="Impossible de creer le solver OR-Tools",
-            repartition={},
-            chiffre_total_ht=Decimal("0"),
-            remise_totale=Decimal("0"),
-            couverture_pct=0.0,
-            solver_time_ms=0,
-            status="SOLVER_ERROR"
-        )
-
-    solver.SetTimeLimit(max_time_seconds * 1000)
-
-    # === VARIABLES DE DECISION ===
-    # x[v,l] = 1 si vente v achetee chez labo l
-    x = {}
-
-    # Coefficient objectif (remise totale)
-    objective = solver.Objective()
-    objective.SetMaximization()
+    # Prix (centimes) et remises (centiemes de %) en entiers, convertis une fois
+    # par produit / labo; les listes produits sont indexees comme la matrice d'exclusions
+    prix_cents = [round((p.prix_ht or 0) * 100) for p in produits_map.values()]
+    remise_ligne_centiemes = [round((p.remise_pct or 0) * 100) for p in produits_map.values()]
+    remise_nego_centiemes = {
+        lid: round((labos[lid].remise_negociee or 0) * 100) if lid in labos else 0
+        for lid in labo_ids
+    }
 
-    # Chiffre par labo (pour contraintes)
-    chiffre_labo = {lid: solver.Sum([]) for lid in labo_ids}
+    # === COEFFICIENTS DU MODELE ===
+    # (vente_id, labo_id, montant_cents, gain_cents) pour chaque affectation possible
+    terms = []
+    # Remise effective (centiemes de %) par affectation, reutilisee a l'extraction
+    remise_eff = {}
+    # Potentiel (chiffre max possible) par labo, cumule dans la meme passe
+    potentiel_cents = dict.fromkeys(labo_ids, 0)
 
-    # Construire variables et contraintes
     for vente in ventes:
         quantite = vente.quantite_annuelle or 0
         if quantite <= 0:
             continue
 
-        vars_vente = []  # Variables pour cette vente
-
         for labo_id in labo_ids:
             matching = matching_map.get((vente.id, labo_id))
-            if not matching or not matching.produit_id:
+            if not matching:
                 continue
 
             produit = produits_map.get(matching.produit_id)
@@ -289,60 +363,81 @@ def optimize_multi_labo(
                 continue
 
             # Verifier exclusion
-            if produit.id in exclusions.get(labo_id, set()):
+            i = produit_index[produit.id]
+            if excluded[i, labo_index[labo_id]]:
                 continue
 
-            # Creer variable
-            var_name = f"x_{vente.id}_{labo_id}"
-            x[(vente.id, labo_id)] = solver.BoolVar(var_name)
-            var = x[(vente.id, labo_id)]
-            vars_vente.append(var)
-
-            # Prix et remise
-            prix = float(produit.prix_ht or 0)
-            remise_ligne = float(produit.remise_pct or 0)
-            remise_nego = float(labos[labo_id].remise_negociee or 0)
-
             # Remise totale = max(remise_ligne, remise_negociee)
             # Simplification: on prend la remise negociee si > remise_ligne
-            remise_effective = max(remise_ligne, remise_nego)
-
-            montant = prix * quantite
-            gain_remise = montant * remise_effective / 100
+            remise_centiemes = max(remise_ligne_centiemes[i], remise_nego_centiemes[labo_id])
+            remise_eff[(vente.id, labo_id)] = remise_centiemes
 
-            # Coefficient objectif = gain remise
-            objective.SetCoefficient(var, gain_remise)
+            # Arithmetique entiere: gain arrondi au centime le plus proche
+            montant_cents = prix_cents[i] * quantite
+            gain_cents = (montant_cents * remise_centiemes + 5000) // 10000
 
-            # Contribution au chiffre du labo
-            chiffre_labo[labo_id] = solver.Sum([
-                chiffre_labo[labo_id],
-                var * montant
-            ])
+            terms.append((vente.id, labo_id, montant_cents, gain_cents))
+            potentiel_cents[labo_id] += montant_cents
 
-        # Contrainte: au plus 1 labo par vente
-        if vars_vente:
-            solver.Add(solver.Sum(vars_vente) <= 1)
-
-    # === CONTRAINTES OBJECTIFS PAR LABO ===
+    # Mettre a jour les potentiels dans les objectifs
     for obj in objectives:
-        min_chiffre = float(obj.get_objectif_minimum())
-        if min_chiffre > 0:
-            solver.Add(chiffre_labo[obj.labo_id] >= min_chiffre)
+        obj.potentiel_ht = Decimal(potentiel_cents.get(obj.labo_id, 0)) / 100
+
+    # Objectifs minimums, calcules une fois les potentiels connus
+    min_by_labo = {obj.labo_id: obj.get_objectif_minimum() for obj in objectives}
+
+    # === CREATION / REUTILISATION DU MODELE ===
+    # Seuls les objectifs minimums changent d'un appel a l'autre (curseur objectif_pct):
+    # a coefficients identiques on reprend le modele et on ne touche qu'aux bornes.
+    start_time = time.perf_counter()
+    model_key = (tuple(labo_ids), tuple(terms))
+    with _model_cache_lock:
+        model = _model_cache.get(model_key)
+    if model is None:
+        model = _build_solver_model(terms, labo_ids)
+        with _model_cache_lock:
+            _model_cache[model_key] = model
+    else:
+        optimizer_logger.info("Reusing cached model, updating objective bounds only")
+
+    x = model.x
 
     # === RESOLUTION ===
-    optimizer_logger.info(f"Solving with {len(x)} variables...")
-    status = solver.Solve()
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = max_time_seconds
+    solver.parameters.num_workers = num_workers
+    # Relaxation LP complete: CP-SAT en tire une borne et fixe a 0 les variables
+    # dont le cout reduit depasse l'ecart a la meilleure solution connue
+    solver.parameters.linearization_level = 2
+
+    with model.lock:
+        # Contraintes objectifs par labo: seule la borne basse varie
+        status = None
+        for obj in objectives:
+            min_cents = math.ceil(min_by_labo[obj.labo_id] * 100)
+            constraint = model.objectif_constraints.get(obj.labo_id)
+            if constraint is None:
+                if min_cents > 0:
+                    status = cp_model.INFEASIBLE  # Objectif sur un labo sans produit disponible
+                continue
+            domain = constraint.Proto().linear.domain
+            domain[:] = [min_cents if min_cents > 0 else cp_model.INT_MIN, cp_model.INT_MAX]
+
+        if status is None:
+            optimizer_logger.info(f"Solving with {len(x)} variables...")
+            status = solver.Solve(model.model)
+        solver_time_ms = (time.perf_counter() - start_time) * 1000
 
     status_names = {
-        pywraplp.Solver.OPTIMAL: "OPTIMAL",
-        pywraplp.Solver.FEASIBLE: "FEASIBLE",
-        pywraplp.Solver.INFEASIBLE: "INFEASIBLE",
-        pywraplp.Solver.UNBOUNDED: "UNBOUNDED",
-        pywraplp.Solver.NOT_SOLVED: "NOT_SOLVED",
+        cp_model.OPTIMAL: "OPTIMAL",
+        cp_model.FEASIBLE: "FEASIBLE",
+        cp_model.INFEASIBLE: "INFEASIBLE",
+        cp_model.MODEL_INVALID: "MODEL_INVALID",
+        cp_model.UNKNOWN: "NOT_SOLVED",
     }
     status_name = status_names.get(status, "UNKNOWN")
 
-    if status not in (pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE):
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
         return OptimizationResult(
             success=False,
             message=f"Pas de solution trouvee (status: {status_name}). "
@@ -351,7 +446,7 @@ def optimize_multi_labo(
             chiffre_total_ht=Decimal("0"),
             remise_totale=Decimal("0"),
             couverture_pct=0.0,
-            solver_time_ms=solver.wall_time(),
+            solver_time_ms=solver_time_ms,
             status=status_name
         )
 
@@ -369,48 +464,51 @@ def optimize_multi_labo(
             "remise_totale": Decimal("0"),
             "nb_produits": 0,
             "objectif_atteint": False,
-            "objectif_minimum": obj.get_objectif_minimum(),
+            "objectif_minimum": min_by_labo[obj.labo_id],
             "potentiel_ht": obj.potentiel_ht,
         }
 
-    for (vente_id, labo_id), var in x.items():
-        if var.solution_value() > 0.5:  # Variable selectionnee
-            vente = next(v for v in ventes if v.id == vente_id)
-            matching = matching_map.get((vente_id, labo_id))
-            produit = produits_map.get(matching.produit_id) if matching else None
-
-            if produit:
-                quantite = vente.quantite_annuelle or 0
-                prix = produit.prix_ht or Decimal("0")
-                montant = prix * quantite
-
-                remise_ligne = produit.remise_pct or Decimal("0")
-                remise_nego = labos[labo_id].remise_negociee or Decimal("0")
-                remise_effective = max(remise_ligne, remise_nego)
-                gain = montant * remise_effective / 100
-
-                repartition[labo_id]["ventes"].append({
-                    "vente_id": vente_id,
-                    "designation": vente.designation,
-                    "produit_id": produit.id,
-                    "produit_nom": produit.nom_commercial,
-                    "quantite": quantite,
-                    "prix_unitaire": float(prix),
-                    "montant_ht": float(montant),
-                    "remise_pct": float(remise_effective),
-                    "gain_remise": float(gain),
-                })
-                repartition[labo_id]["chiffre_ht"] += montant
-                repartition[labo_id]["remise_totale"] += gain
-                repartition[labo_id]["nb_produits"] += 1
-
-                chiffre_total += montant
-                remise_totale += gain
+    # Valeurs de solution lues en bloc depuis la reponse du solver
+    x_items = list(x.items())
+    vals = np.asarray(solver.ResponseProto().solution, dtype=np.int64)[model.var_indices]
+    selected = np.flatnonzero(vals)  # Variables selectionnees
+
+    for k in selected:
+        (vente_id, labo_id), _ = x_items[k]
+        vente = ventes_by_id[vente_id]
+        matching = matching_map.get((vente_id, labo_id))
+        produit = produits_map.get(matching.produit_id) if matching else None
+
+        if produit:
+            quantite = vente.quantite_annuelle or 0
+            prix = produit.prix_ht or Decimal("0")
+            montant = prix * quantite
+
+            remise_effective = Decimal(remise_eff[(vente_id, labo_id)]) / 100
+            gain = montant * remise_effective / 100
+
+            repartition[labo_id]["ventes"].append({
+                "vente_id": vente_id,
+                "designation": vente.designation,
+                "produit_id": produit.id,
+                "produit_nom": produit.nom_commercial,
+                "quantite": quantite,
+                "prix_unitaire": float(prix),
+                "montant_ht": float(montant),
+                "remise_pct": float(remise_effective),
+                "gain_remise": float(gain),
+            })
+            repartition[labo_id]["chiffre_ht"] += montant
+            repartition[labo_id]["remise_totale"] += gain
+            repartition[labo_id]["nb_produits"] += 1
+
+            chiffre_total += montant
+            remise_totale += gain
 
     # Verifier objectifs atteints
     for obj in objectives:
         labo_data = repartition[obj.labo_id]
-        labo_data["objectif_atteint"] = labo_data["chiffre_ht"] >= obj.get_objectif_minimum()
+        labo_data["objectif_atteint"] = labo_data["chiffre_ht"] >= min_by_labo[obj.labo_id]
 
     # Calculer couverture
     chiffre_bdpm_total = sum(
@@ -426,6 +524,49 @@ def optimize_multi_labo(
         chiffre_total_ht=chiffre_total,
         remise_totale=remise_totale,
         couverture_pct=round(couverture, 2),
-        solver_time_ms=solver.wall_time(),
+        solver_time_ms=solver_time_ms,
         status=status_name
     )
+
+
+def _run_scenario(import_id: int, objectives: list[LaboObjective], max_time_seconds: int, num_workers: int) -> OptimizationResult:
+    """Execute un scenario dans un process worker, avec sa propre session."""
+    from app.db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return optimize_multi_labo(db, import_id, objectives, max_time_seconds, num_workers)
+    finally:
+        db.close()
+
+
+def optimize_multi_labo_batch(
+    import_id: int,
+    scenarios: list[list[LaboObjective]],
+    max_time_seconds: int = 30
+) -> list[OptimizationResult]:
+    """
+    Optimise plusieurs scenarios (jeux d'objectifs) d'un meme import en parallele.
+
+    Chaque scenario tourne dans un process separe avec sa propre session; les
+    coeurs sont repartis entre les process et les threads CP-SAT de chacun.
+
+    Returns:
+        Un OptimizationResult par scenario, dans l'ordre des scenarios
+    """
+    if not scenarios:
+        return []
+
+    nb_cpu = os.cpu_count() or 1
+    nb_process = min(len(scenarios), nb_cpu)
+    threads_par_solve = max(1, nb_cpu // nb_process)
+
+    # spawn: pas de connexions SQLAlchemy heritees du process parent
+    with ProcessPoolExecutor(max_workers=nb_process, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(
+            _run_scenario,
+            [import_id] * len(scenarios),
+            scenarios,
+            [max_time_seconds] * len(scenarios),
+            [threads_par_solve] * len(scenarios),
+        ))
@@ -1,10 +1,11 @@
 import os
+import asyncio
 import json
+import orjson
 import re
-import io
 import logging
 from typing import Dict, Any, Optional, List
-import pdfplumber
+import pypdfium2 as pdfium
 from openai import AsyncOpenAI
 
 # Configuration du logging
@@ -54,6 +55,28 @@ Texte a analyser:
 """
 
 
+PAGES_PAR_LOT = 5  # Nombre de pages par appel IA
+MAX_LOTS_EN_COURS = 4  # Lots extraits et envoyes a l'IA en parallele
+
+
+def _extract_lot_text(pdf: pdfium.PdfDocument, first_page: int, last_page: int) -> str:
+    """
+    Extrait le texte des pages first_page..last_page (1-indexed, incluses).
+
+    PDFium (C) au lieu de pdfminer (pur Python): extraction bien plus rapide,
+    sans verrouiller le GIL pendant le parsing.
+    """
+    lot_text = ""
+    for page_num in range(first_page, last_page + 1):
+        page = pdf[page_num - 1]
+        textpage = page.get_textpage()
+        text = textpage.get_text_range().replace("\r\n", "\n")
+        textpage.close()
+        page.close()
+        lot_text += f"\n--- Page {page_num} ---\n{text}"
+    return lot_text
+
+
 async def extract_catalogue_from_pdf(
     pdf_content: bytes,
     page_debut: int = 1,
@@ -64,6 +87,10 @@ async def extract_catalogue_from_pdf(
     Extrait les donnees d'un catalogue PDF avec IA.
     Découpe automatiquement en lots de 5 pages pour éviter les limites de tokens.
 
+    Les lots sont traites en flux: l'extraction du texte d'un lot (PDFium,
+    dans un thread) se fait pendant que les lots precedents sont chez OpenAI.
+    Au plus MAX_LOTS_EN_COURS lots sont en memoire a la fois.
+
     Args:
         pdf_content: Contenu binaire du PDF
         page_debut: Page de debut (1-indexed)
@@ -73,71 +100,101 @@ async def extract_catalogue_from_pdf(
     Returns:
         Dict avec lignes extraites, nb_pages, et modele utilise
     """
-    PAGES_PAR_LOT = 5  # Nombre de pages par appel IA
-
     logger.info(f"=== DEBUT EXTRACTION PDF ===")
     logger.info(f"Pages: {page_debut} à {page_fin}, Modèle: {modele_ia}")
 
-    # Convertir bytes en file-like object et extraire texte par page
-    pdf_file = io.BytesIO(pdf_content)
-    pages_text = []  # Liste de tuples (page_num, text)
+    # Determiner le modele a utiliser
+    model = "gpt-4o-mini" if modele_ia == "auto" else modele_ia
+    retry_enabled = modele_ia == "auto"
+    slots = asyncio.Semaphore(MAX_LOTS_EN_COURS)
+
+    async def process_lot(lot_idx: int, first_page: int, last_page: int, lot_text: str):
+        try:
+            logger.info(f"Lot {lot_idx + 1}: pages {first_page}-{last_page}, {len(lot_text)} caractères")
+
+            # Appeler l'API OpenAI pour ce lot
+            lignes, raw_response = await call_openai_extraction(lot_text, model)
+            logger.info(f"Lot {lot_idx + 1}: {len(lignes)} lignes extraites")
+
+            # Texte conserve uniquement pour les lots a relancer avec gpt-4o
+            a_relancer = lot_text if retry_enabled and not lignes else None
+            return [lignes, raw_response, a_relancer]
+        finally:
+            slots.release()
+
+    async def retry_lot(lot_idx: int, lot_text: str):
+        async with slots:
+            logger.info(f"Lot {lot_idx + 1}: retry avec gpt-4o")
+            lignes, raw_response = await call_openai_extraction(lot_text, "gpt-4o")
+            logger.info(f"Lot {lot_idx + 1} (retry gpt-4o): {len(lignes)} lignes extraites")
+            return lignes, raw_response
+
+    # Ouvrir le PDF depuis les bytes et extraire le texte lot par lot
+    # (PDFium n'est pas thread-safe: un seul lot extrait a la fois)
+    tasks = []
+    extraction = None  # Extraction PDFium en cours dans un thread
+    pdf = pdfium.PdfDocument(pdf_content)
 
-    with pdfplumber.open(pdf_file) as pdf:
-        total_pages = len(pdf.pages)
+    try:
+        total_pages = len(pdf)
         end_page = min(page_fin or total_pages, total_pages)
         logger.info(f"PDF: {total_pages} pages totales, extraction de {page_debut} à {end_page}")
 
-        for i in range(page_debut - 1, end_page):
-            page = pdf.pages[i]
-            text = page.extract_text() or ""
-            pages_text.append((i + 1, text))
-
-    nb_pages = len(pages_text)
-    logger.info(f"Texte extrait de {nb_pages} pages")
-
-    if not pages_text:
-        logger.warning("AUCUN TEXTE EXTRAIT DU PDF!")
-        return {"lignes": [], "nb_pages": 0, "modele": modele_ia, "raw_response": ""}
-
-    # Determiner le modele a utiliser
-    if modele_ia == "auto":
-        model = "gpt-4o-mini"
-    else:
-        model = modele_ia
+        nb_pages = max(0, end_page - page_debut + 1)
+        if not nb_pages:
+            logger.warning("AUCUN TEXTE EXTRAIT DU PDF!")
+            return {"lignes": [], "nb_pages": 0, "modele": modele_ia, "raw_response": ""}
+
+        nb_lots = (nb_pages + PAGES_PAR_LOT - 1) // PAGES_PAR_LOT
+        logger.info(f"Extraction en {nb_lots} lot(s) de {PAGES_PAR_LOT} pages max")
+
+        try:
+            for lot_idx, first_page in enumerate(range(page_debut, end_page + 1, PAGES_PAR_LOT)):
+                last_page = min(first_page + PAGES_PAR_LOT - 1, end_page)
+
+                # Attendre qu'un lot en cours se termine avant d'en extraire un nouveau
+                await slots.acquire()
+                extraction = asyncio.ensure_future(
+                    asyncio.to_thread(_extract_lot_text, pdf, first_page, last_page)
+                )
+                try:
+                    # shield: annuler la requete n'arrete pas le thread, qui est
+                    # attendu dans le finally avant de fermer le document
+                    lot_text = await asyncio.shield(extraction)
+                except BaseException:
+                    slots.release()
+                    raise
+                tasks.append(asyncio.create_task(process_lot(lot_idx, first_page, last_page, lot_text)))
+
+            # Resultats dans l'ordre des lots
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+    finally:
+        # Aucun thread ne doit encore lire le document quand il est ferme
+        if extraction is not None and not extraction.done():
+            await asyncio.wait({extraction})
+        pdf.close()
+
+    # Si échec avec gpt-4o-mini en mode auto: second passage, en parallele,
+    # sur les seuls lots vides
+    lots_a_relancer = [idx for idx, result in enumerate(results) if result[2] is not None]
+    if lots_a_relancer:
+        retries = await asyncio.gather(*(retry_lot(idx, results[idx][2]) for idx in lots_a_relancer))
+        for idx, (lignes, raw_response) in zip(lots_a_relancer, retries):
+            results[idx][0], results[idx][1] = lignes, raw_response
+            if lignes:
+                model = "gpt-4o"
 
-    # Découper en lots et extraire
     all_lignes = []
     all_raw_responses = []
-    nb_lots = (nb_pages + PAGES_PAR_LOT - 1) // PAGES_PAR_LOT
-
-    logger.info(f"Extraction en {nb_lots} lot(s) de {PAGES_PAR_LOT} pages max")
-
-    for lot_idx in range(nb_lots):
-        start_idx = lot_idx * PAGES_PAR_LOT
-        end_idx = min(start_idx + PAGES_PAR_LOT, nb_pages)
-        lot_pages = pages_text[start_idx:end_idx]
-
-        # Construire le texte du lot
-        lot_text = ""
-        for page_num, text in lot_pages:
-            lot_text += f"\n--- Page {page_num} ---\n{text}"
-
-        logger.info(f"Lot {lot_idx + 1}/{nb_lots}: pages {lot_pages[0][0]}-{lot_pages[-1][0]}, {len(lot_text)} caractères")
-
-        # Appeler l'API OpenAI pour ce lot
-        lignes, raw_response = await call_openai_extraction(lot_text, model)
-        logger.info(f"Lot {lot_idx + 1}: {len(lignes)} lignes extraites")
-
-        # Si échec avec gpt-4o-mini en mode auto, retry avec gpt-4o
-        if modele_ia == "auto" and len(lignes) == 0 and model == "gpt-4o-mini":
-            logger.info(f"Lot {lot_idx + 1}: retry avec gpt-4o")
-            lignes, raw_response = await call_openai_extraction(lot_text, "gpt-4o")
-            if lignes:
-                model = "gpt-4o"  # Switcher pour les lots suivants aussi
-            logger.info(f"Lot {lot_idx + 1} (retry gpt-4o): {len(lignes)} lignes extraites")
-
+    for lot_idx, (lignes, raw_response, _) in enumerate(results):
+        first_page = page_debut + lot_idx * PAGES_PAR_LOT
+        last_page = min(first_page + PAGES_PAR_LOT - 1, end_page)
         all_lignes.extend(lignes)
-        all_raw_responses.append(f"=== LOT {lot_idx + 1} (pages {lot_pages[0][0]}-{lot_pages[-1][0]}) ===\n{raw_response}")
+        all_raw_responses.append(f"=== LOT {lot_idx + 1} (pages {first_page}-{last_page}) ===\n{raw_response}")
 
     logger.info(f"=== FIN EXTRACTION PDF: {len(all_lignes)} lignes totales ===")
 
@@ -188,7 +245,7 @@ async def call_openai_extraction(text: str, model: str) -> tuple[List[Dict[str,
             content = re.sub(r"\n?```$", "", content)
 
         # Parser le JSON
-        lignes = json.loads(content)
+        lignes = orjson.loads(content)
         logger.info(f"JSON parsé avec succès: {len(lignes)} lignes")
 
         # Ajouter un score de confiance basique
@@ -204,7 +261,7 @@ async def call_openai_extraction(text: str, model: str) -> tuple[List[Dict[str,
 
         return lignes, raw_response
 
-    except json.JSONDecodeError as e:
+    except json.JSONDecodeError as e:  # orjson.JSONDecodeError en herite
         logger.error(f"ERREUR JSON: {e}")
         logger.error(f"Contenu qui a échoué: {raw_response[:1000]}")
         return [], raw_response
@@ -12,13 +12,16 @@ Structure du rapport:
 """
 import io
 import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from datetime import datetime
 from typing import List, Dict, Optional, Any
 
+import numpy as np
 import matplotlib
 matplotlib.use('Agg')  # Backend sans GUI
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.figure import Figure
 
 from reportlab.lib import colors
@@ -27,16 +30,22 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm, mm
 from reportlab.platypus import (
     SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle,
-    Image, PageBreak, HRFlowable
+    PageBreak, HRFlowable
 )
+from reportlab.graphics.shapes import Drawing
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from svglib.svglib import svg2rlg
+
+
+# Separateurs francais: milliers en espace, decimales en virgule
+_EUR_TRANS = str.maketrans({',': ' ', '.': ','})
 
 
 def format_euro(value: Decimal | float) -> str:
     """Formate un montant en euros."""
     if isinstance(value, Decimal):
         value = float(value)
-    return f"{value:,.2f} EUR".replace(",", " ").replace(".", ",")
+    return f"{value:,.2f} EUR".translate(_EUR_TRANS)
 
 
 def format_pct(value: float) -> str:
@@ -45,104 +54,143 @@ def format_pct(value: float) -> str:
 
 
 class ChartGenerator:
-    """Generateur de graphiques pour le rapport."""
+    """
+    Generateur de graphiques pour le rapport.
+
+    API objet de Matplotlib (Figure + FigureCanvasAgg, sans pyplot): chaque type
+    de graphique garde sa Figure, creee une fois puis videe et redessinee a chaque
+    appel (pas de recreation de figure ni de resolution rcParams/polices).
+    Les figures etant partagees, un verrou par graphique serialise les rendus
+    d'un meme graphique; des graphiques differents peuvent etre rendus en parallele.
+    """
+
+    def __init__(self):
+        self._figures: Dict[str, Figure] = {}
+        self._locks: Dict[str, threading.Lock] = {
+            key: threading.Lock() for key in ('coverage_pie', 'remise_bars', 'labos_comparison')
+        }
+
+    def _get_figure(self, key: str, figsize: tuple) -> Figure:
+        """Retourne la figure reutilisable de ce graphique, videe et a la bonne taille."""
+        fig = self._figures.get(key)
+        if fig is None:
+            fig = Figure(figsize=figsize)
+            FigureCanvasAgg(fig)
+            self._figures[key] = fig
+        else:
+            fig.clear()
+            fig.set_size_inches(figsize)
+        return fig
 
     @staticmethod
+    def _to_svg(fig: Figure) -> io.BytesIO:
+        """
+        Rend la figure en SVG (vectoriel).
+
+        Pas d'encodage/decodage PNG: le SVG est converti en Drawing ReportLab
+        et reste vectoriel dans le PDF (plus net et plus leger).
+        Les marges sont fixees par graphique (subplots_adjust), sans solveur de mise en page.
+        Le buffer est retourne rembobine (pas de copie via getvalue()).
+        """
+        buf = io.BytesIO()
+        fig.savefig(buf, format='svg', metadata={'Date': None})
+        buf.seek(0)
+        return buf
+
     def create_coverage_pie(
+        self,
         chiffre_realise: float,
         chiffre_perdu: float
-    ) -> bytes:
+    ) -> io.BytesIO:
         """
         Cree un camembert de couverture.
 
         Returns:
-            Image PNG en bytes
+            Buffer contenant l'image SVG
         """
-        fig, ax = plt.subplots(figsize=(5, 4))
+        with self._locks['coverage_pie']:
+            fig = self._get_figure('coverage_pie', (5, 4))
+            ax = fig.add_subplot()
+
+            sizes = [chiffre_realise, chiffre_perdu]
+            labels = [
+                f'Realisable\n{format_euro(chiffre_realise)}',
+                f'Perdu\n{format_euro(chiffre_perdu)}'
+            ]
+            colors_pie = ['#4CAF50', '#F44336']  # Vert, Rouge
+            explode = (0.02, 0.02)
+
+            wedges, texts, autotexts = ax.pie(
+                sizes,
+                explode=explode,
+                labels=labels,
+                colors=colors_pie,
+                autopct='%1.1f%%',
+                shadow=False,
+                startangle=90
+            )
 
-        sizes = [chiffre_realise, chiffre_perdu]
-        labels = [
-            f'Realisable\n{format_euro(chiffre_realise)}',
-            f'Perdu\n{format_euro(chiffre_perdu)}'
-        ]
-        colors_pie = ['#4CAF50', '#F44336']  # Vert, Rouge
-        explode = (0.02, 0.02)
-
-        wedges, texts, autotexts = ax.pie(
-            sizes,
-            explode=explode,
-            labels=labels,
-            colors=colors_pie,
-            autopct='%1.1f%%',
-            shadow=False,
-            startangle=90
-        )
+            # Style des textes
+            for autotext in autotexts:
+                autotext.set_fontsize(10)
+                autotext.set_fontweight('bold')
 
-        # Style des textes
-        for autotext in autotexts:
-            autotext.set_fontsize(10)
-            autotext.set_fontweight('bold')
+            ax.set_title('Couverture du Catalogue', fontsize=12, fontweight='bold')
+            ax.axis('equal')
 
-        ax.set_title('Couverture du Catalogue', fontsize=12, fontweight='bold')
-        ax.axis('equal')
+            fig.subplots_adjust(left=0.08, right=0.92, top=0.88, bottom=0.06)
 
-        # Convertir en bytes
-        buf = io.BytesIO()
-        plt.tight_layout()
-        plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-        plt.close(fig)
-        buf.seek(0)
-        return buf.getvalue()
+            # Convertir en SVG
+            return self._to_svg(fig)
 
-    @staticmethod
     def create_remise_bars(
+        self,
         remise_ligne: float,
         remontee: float,
         total: float
-    ) -> bytes:
+    ) -> io.BytesIO:
         """
         Cree un graphique barres des remises.
 
         Returns:
-            Image PNG en bytes
+            Buffer contenant l'image SVG
         """
-        fig, ax = plt.subplots(figsize=(6, 4))
-
-        categories = ['Remise Facture', 'Remontee', 'Total']
-        values = [remise_ligne, remontee, total]
-        colors_bar = ['#2196F3', '#FF9800', '#4CAF50']
-
-        bars = ax.bar(categories, values, color=colors_bar, edgecolor='white', linewidth=1.2)
-
-        # Ajouter les valeurs sur les barres
-        for bar, val in zip(bars, values):
-            height = bar.get_height()
-            ax.annotate(
-                format_euro(val),
-                xy=(bar.get_x() + bar.get_width() / 2, height),
-                xytext=(0, 3),
-                textcoords="offset points",
-                ha='center', va='bottom',
-                fontsize=9, fontweight='bold'
-            )
+        with self._locks['remise_bars']:
+            fig = self._get_figure('remise_bars', (6, 4))
+            ax = fig.add_subplot()
+
+            categories = ['Remise Facture', 'Remontee', 'Total']
+            values = [remise_ligne, remontee, total]
+            colors_bar = ['#2196F3', '#FF9800', '#4CAF50']
+
+            bars = ax.bar(categories, values, color=colors_bar, edgecolor='white', linewidth=1.2)
+
+            # Ajouter les valeurs sur les barres
+            for bar, val in zip(bars, values):
+                height = bar.get_height()
+                ax.annotate(
+                    format_euro(val),
+                    xy=(bar.get_x() + bar.get_width() / 2, height),
+                    xytext=(0, 3),
+                    textcoords="offset points",
+                    ha='center', va='bottom',
+                    fontsize=9, fontweight='bold'
+                )
+
+            ax.set_ylabel('Montant (EUR)', fontsize=10)
+            ax.set_title('Decomposition des Remises', fontsize=12, fontweight='bold')
+            ax.spines['top'].set_visible(False)
+            ax.spines['right'].set_visible(False)
+
+            fig.subplots_adjust(left=0.15, right=0.97, top=0.90, bottom=0.10)
+
+            # Convertir en SVG
+            return self._to_svg(fig)
 
-        ax.set_ylabel('Montant (EUR)', fontsize=10)
-        ax.set_title('Decomposition des Remises', fontsize=12, fontweight='bold')
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-
-        # Convertir en bytes
-        buf = io.BytesIO()
-        plt.tight_layout()
-        plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-        plt.close(fig)
-        buf.seek(0)
-        return buf.getvalue()
-
-    @staticmethod
     def create_labos_comparison(
+        self,
         labos_data: List[Dict]
-    ) -> bytes:
+    ) -> io.BytesIO:
         """
         Cree un graphique barres horizontales comparant les labos.
 
@@ -150,56 +198,60 @@ class ChartGenerator:
             labos_data: Liste de dicts avec 'nom', 'chiffre_recupere', 'remise_estimee'
 
         Returns:
-            Image PNG en bytes
+            Buffer contenant l'image SVG
         """
-        if not labos_data:
-            # Graphique vide
-            fig, ax = plt.subplots(figsize=(6, 3))
-            ax.text(0.5, 0.5, 'Aucun labo complementaire', ha='center', va='center')
-            ax.axis('off')
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-            plt.close(fig)
-            buf.seek(0)
-            return buf.getvalue()
-
-        fig, ax = plt.subplots(figsize=(8, max(3, len(labos_data) * 0.5 + 1)))
-
-        noms = [d['nom'] for d in labos_data]
-        remises = [float(d['remise_estimee']) for d in labos_data]
-
-        y_pos = range(len(noms))
-        colors_bar = plt.cm.Blues([(i + 3) / (len(noms) + 5) for i in range(len(noms))])
-
-        bars = ax.barh(y_pos, remises, color=colors_bar, edgecolor='white', linewidth=1)
-
-        # Ajouter les valeurs
-        for bar, val in zip(bars, remises):
-            width = bar.get_width()
-            ax.annotate(
-                format_euro(val),
-                xy=(width, bar.get_y() + bar.get_height() / 2),
-                xytext=(5, 0),
-                textcoords="offset points",
-                ha='left', va='center',
-                fontsize=9
-            )
-
-        ax.set_yticks(y_pos)
-        ax.set_yticklabels(noms)
-        ax.invert_yaxis()
-        ax.set_xlabel('Montant Remise Estimee (EUR)', fontsize=10)
-        ax.set_title('Comparaison Labos Complementaires', fontsize=12, fontweight='bold')
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-
-        # Convertir en bytes
-        buf = io.BytesIO()
-        plt.tight_layout()
-        plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-        plt.close(fig)
-        buf.seek(0)
-        return buf.getvalue()
+        with self._locks['labos_comparison']:
+            if not labos_data:
+                # Graphique vide
+                fig = self._get_figure('labos_comparison', (6, 3))
+                ax = fig.add_subplot()
+                ax.text(0.5, 0.5, 'Aucun labo complementaire', ha='center', va='center')
+                ax.axis('off')
+                fig.subplots_adjust(left=0, right=1, top=1, bottom=0)
+                return self._to_svg(fig)
+
+            fig = self._get_figure('labos_comparison', (8, max(3, len(labos_data) * 0.5 + 1)))
+            ax = fig.add_subplot()
+
+            noms, remises = zip(*((d['nom'], float(d['remise_estimee'])) for d in labos_data))
+
+            n = len(noms)
+            y_pos = range(n)
+            colors_bar = matplotlib.colormaps['Blues'](np.linspace(3 / (n + 5), (n + 2) / (n + 5), n))
+
+            bars = ax.barh(y_pos, remises, color=colors_bar, edgecolor='white', linewidth=1)
+
+            # Ajouter les valeurs
+            for bar, val in zip(bars, remises):
+                width = bar.get_width()
+                ax.annotate(
+                    format_euro(val),
+                    xy=(width, bar.get_y() + bar.get_height() / 2),
+                    xytext=(5, 0),
+                    textcoords="offset points",
+                    ha='left', va='center',
+                    fontsize=9
+                )
+
+            ax.set_yticks(y_pos)
+            ax.set_yticklabels(noms)
+            ax.invert_yaxis()
+            ax.set_xlabel('Montant Remise Estimee (EUR)', fontsize=10)
+            ax.set_title('Comparaison Labos Complementaires', fontsize=12, fontweight='bold')
+            ax.spines['top'].set_visible(False)
+            ax.spines['right'].set_visible(False)
+
+            # Marge gauche selon le plus long nom de labo (~0.075 pouce par caractere)
+            width, height = fig.get_size_inches()
+            left = min(0.5, (max(len(nom) for nom in noms) * 0.075 + 0.25) / width)
+            fig.subplots_adjust(left=left, right=0.88, top=1 - 0.45 / height, bottom=0.6 / height)
+
+            # Convertir en SVG
+            return self._to_svg(fig)
+
+
+# Generateur de graphiques partage entre rapports (figures reutilisees)
+_chart_generator = ChartGenerator()
 
 
 class PDFReportGenerator:
@@ -208,7 +260,8 @@ class PDFReportGenerator:
     def __init__(self):
         self.styles = getSampleStyleSheet()
         self._setup_styles()
-        self.chart_gen = ChartGenerator()
+        self._setup_table_styles()
+        self.chart_gen = _chart_generator
 
     def _setup_styles(self):
         """Configure les styles personnalises."""
@@ -250,6 +303,51 @@ class PDFReportGenerator:
             alignment=TA_CENTER
         ))
 
+    def _setup_table_styles(self):
+        """Construit une fois les styles de tableaux (reutilises par chaque rapport)."""
+        self.summary_table_style = TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('FONTNAME', (0, 6), (0, 6), 'Helvetica-Bold'),  # TOTAL REMISES
+            ('FONTSIZE', (0, 6), (-1, 6), 12),
+            ('TEXTCOLOR', (1, 6), (1, 6), colors.HexColor('#4CAF50')),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('LINEBELOW', (0, 2), (-1, 2), 0.5, colors.lightgrey),
+            ('LINEBELOW', (0, 6), (-1, 6), 1, colors.HexColor('#4CAF50')),
+        ])
+        self.products_table_style = TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E3F2FD')),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ])
+        self.reco_table_style = TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E3F2FD')),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ])
+
+    @staticmethod
+    def _chart_flowable(svg_buf: io.BytesIO, width: float, height: float) -> Drawing:
+        """Convertit un graphique SVG en Drawing ReportLab vectoriel, mis a la taille voulue."""
+        drawing = svg2rlg(svg_buf)
+        drawing.scale(width / drawing.width, height / drawing.height)
+        drawing.width, drawing.height = width, height
+        drawing.hAlign = 'CENTER'
+        return drawing
+
     def _create_summary_table(self, totaux: Dict) -> Table:
         """Cree le tableau de resume."""
         data = [
@@ -266,18 +364,7 @@ class PDFReportGenerator:
         ]
 
         table = Table(data, colWidths=[6*cm, 4*cm])
-        table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('FONTNAME', (0, 6), (0, 6), 'Helvetica-Bold'),  # TOTAL REMISES
-            ('FONTSIZE', (0, 6), (-1, 6), 12),
-            ('TEXTCOLOR', (1, 6), (1, 6), colors.HexColor('#4CAF50')),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('LINEBELOW', (0, 2), (-1, 2), 0.5, colors.lightgrey),
-            ('LINEBELOW', (0, 6), (-1, 6), 1, colors.HexColor('#4CAF50')),
-        ]))
+        table.setStyle(self.summary_table_style)
         return table
 
     def _create_products_table(self, products: List[Dict], title: str = "Produits Non Couverts") -> List:
@@ -305,17 +392,7 @@ class PDFReportGenerator:
             ])
 
         table = Table(data, colWidths=[8*cm, 3*cm, 5*cm])
-        table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E3F2FD')),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ]))
+        table.setStyle(self.products_table_style)
 
         elements.append(table)
         return elements
@@ -343,6 +420,32 @@ class PDFReportGenerator:
         Returns:
             Contenu PDF en bytes
         """
+        # Les trois graphiques sont independants: rendus en parallele
+        labos_chart_data = [
+            {
+                'nom': r.get('lab_nom', '?'),
+                'chiffre_recupere': r.get('chiffre_recupere_ht', 0),
+                'remise_estimee': r.get('montant_remise_estime', 0)
+            }
+            for r in (recommendations or [])[:8]
+        ]
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            pie_future = executor.submit(
+                self.chart_gen.create_coverage_pie,
+                float(totaux.get('chiffre_realisable_ht', 0)),
+                float(totaux.get('chiffre_perdu_ht', 0))
+            )
+            bar_future = executor.submit(
+                self.chart_gen.create_remise_bars,
+                float(totaux.get('total_remise_ligne', 0)),
+                float(totaux.get('total_remontee', 0)),
+                float(totaux.get('total_remise_globale', 0))
+            )
+            comp_future = (
+                executor.submit(self.chart_gen.create_labos_comparison, labos_chart_data)
+                if recommendations else None
+            )
+
         buffer = io.BytesIO()
         doc = SimpleDocTemplate(
             buffer,
@@ -374,23 +477,14 @@ class PDFReportGenerator:
         # ===== GRAPHIQUE COUVERTURE =====
         elements.append(Paragraph("Couverture du Catalogue", self.styles['SectionTitle']))
 
-        pie_data = self.chart_gen.create_coverage_pie(
-            float(totaux.get('chiffre_realisable_ht', 0)),
-            float(totaux.get('chiffre_perdu_ht', 0))
-        )
-        pie_image = Image(io.BytesIO(pie_data), width=10*cm, height=8*cm)
+        pie_image = self._chart_flowable(pie_future.result(), width=10*cm, height=8*cm)
         elements.append(pie_image)
         elements.append(Spacer(1, 1*cm))
 
         # ===== GRAPHIQUE REMISES =====
         elements.append(Paragraph("Decomposition des Remises", self.styles['SectionTitle']))
 
-        bar_data = self.chart_gen.create_remise_bars(
-            float(totaux.get('total_remise_ligne', 0)),
-            float(totaux.get('total_remontee', 0)),
-            float(totaux.get('total_remise_globale', 0))
-        )
-        bar_image = Image(io.BytesIO(bar_data), width=12*cm, height=8*cm)
+        bar_image = self._chart_flowable(bar_future.result(), width=12*cm, height=8*cm)
         elements.append(bar_image)
 
         elements.append(PageBreak())
@@ -405,17 +499,7 @@ class PDFReportGenerator:
             ))
             elements.append(Spacer(1, 0.5*cm))
 
-            labos_chart_data = [
-                {
-                    'nom': r.get('lab_nom', '?'),
-                    'chiffre_recupere': r.get('chiffre_recupere_ht', 0),
-                    'remise_estimee': r.get('montant_remise_estime', 0)
-                }
-                for r in recommendations[:8]
-            ]
-
-            comp_chart = self.chart_gen.create_labos_comparison(labos_chart_data)
-            comp_image = Image(io.BytesIO(comp_chart), width=14*cm, height=6*cm)
+            comp_image = self._chart_flowable(comp_future.result(), width=14*cm, height=6*cm)
             elements.append(comp_image)
             elements.append(Spacer(1, 1*cm))
 
@@ -430,16 +514,7 @@ class PDFReportGenerator:
                 ])
 
             reco_table = Table(reco_data, colWidths=[4*cm, 4*cm, 4*cm, 3*cm])
-            reco_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E3F2FD')),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ]))
+            reco_table.setStyle(self.reco_table_style)
             elements.append(reco_table)
 
         # ===== BEST COMBO =====
@@ -486,6 +561,19 @@ class PDFReportGenerator:
 
 
 # Fonction utilitaire pour usage direct
+# Generateur partage: feuille de styles construite une seule fois par process
+# (lecture seule ensuite, le document est recree a chaque rapport)
+_generator: Optional[PDFReportGenerator] = None
+
+
+def get_report_generator() -> PDFReportGenerator:
+    """Recupere ou cree le generateur de rapports partage."""
+    global _generator
+    if _generator is None:
+        _generator = PDFReportGenerator()
+    return _generator
+
+
 def generate_pdf_report(
     labo_nom: str,
     totaux: Dict,
@@ -508,7 +596,7 @@ def generate_pdf_report(
     Returns:
         PDF en bytes
     """
-    generator = PDFReportGenerator()
+    generator = get_report_generator()
     return generator.generate_simulation_report(
         labo_nom=labo_nom,
         totaux=totaux,
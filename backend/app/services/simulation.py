@@ -1,11 +1,98 @@
+from sqlalchemy import Integer, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from decimal import Decimal
+import numpy as np
 
 from app.models import Scenario, MesVentes, CatalogueProduit, Laboratoire, ResultatSimulation
 from app.schemas import TotauxSimulation
 
 
+# Statut de remontee par code (indice dans ce tuple)
+_STATUTS_REMONTEE = ("normal", "exclu", "partiel")
+
+# Colonnes lues par calculate_totaux: a requeter avec db.query(*TOTAUX_COLUMNS)
+# (tuples legers, sans hydratation ORM des ResultatSimulation)
+TOTAUX_COLUMNS = (
+    ResultatSimulation.montant_ht,
+    ResultatSimulation.montant_remise_ligne,
+    ResultatSimulation.montant_remontee,
+    ResultatSimulation.montant_total_remise,
+    ResultatSimulation.disponible,
+    ResultatSimulation.statut_remontee,
+)
+
+# Tableau structure construit par calculate_totaux
+_TOTAUX_DTYPE = np.dtype([
+    ('montant_ht', 'f8'),
+    ('montant_remise_ligne', 'f8'),
+    ('montant_remontee', 'f8'),
+    ('montant_total_remise', 'f8'),
+    ('disponible', '?'),
+    ('exclu', '?'),
+])
+
+
+def _cibles_remontee(
+    remise_ligne: np.ndarray,
+    remontee_pct: np.ndarray,
+    remise_negociee: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Statut et % cible de remontee, par produit du catalogue.
+
+    Ne depend que du produit (et du % negocie du labo): calcule une fois sur
+    le catalogue puis reporte sur les ventes par indexation.
+    remontee_pct vaut NaN quand la remontee n'est pas renseignee (NULL).
+
+    Returns:
+        (statut_code, remontee_cible)
+    """
+    # Determiner le % cible de remontee:
+    # - remontee_pct NULL -> % negocie du labo (normal)
+    # - remontee_pct 0 -> pas de remontee (exclu)
+    # - sinon -> % specifique (partiel)
+    remontee_normale = np.isnan(remontee_pct)
+    remontee_exclue = remontee_pct == 0
+    statut_code = np.select([remontee_normale, remontee_exclue], [0, 1], default=2)
+    remontee_cible = np.select(
+        [remontee_normale, remontee_exclue], [remise_negociee, remise_ligne], default=remontee_pct
+    )
+    return statut_code, remontee_cible
+
+
+def _calculer_remises(
+    montant_ht: np.ndarray,
+    remise_ligne: np.ndarray,
+    remontee_cible: np.ndarray
+) -> Tuple[np.ndarray, ...]:
+    """
+    Noyau de calcul des remises, une passe par grandeur sur des tableaux float64.
+
+    Les sorties intermediaires sont calculees en place (out=) pour eviter
+    les tableaux temporaires; l'ordre des operations est celui du calcul
+    ligne a ligne, les valeurs sont donc identiques.
+
+    Returns:
+        (montant_remise_ligne, montant_remontee, remise_totale, montant_total_remise)
+    """
+    montant_remise_ligne = np.divide(remise_ligne, 100)
+    np.multiply(montant_ht, montant_remise_ligne, out=montant_remise_ligne)
+
+    # Calcul du complement
+    complement_pct = np.subtract(remontee_cible, remise_ligne)
+    np.maximum(complement_pct, 0.0, out=complement_pct)
+
+    montant_remontee = np.divide(complement_pct, 100)
+    np.multiply(montant_ht, montant_remontee, out=montant_remontee)
+
+    montant_total_remise = np.add(montant_remise_ligne, montant_remontee)
+    remise_totale = np.add(remise_ligne, complement_pct, out=complement_pct)
+
+    return montant_remise_ligne, montant_remontee, remise_totale, montant_total_remise
+
+
 def run_simulation(db: Session, scenario: Scenario) -> List[Dict[str, Any]]:
     """
     Execute la simulation pour un scenario donne.
@@ -14,70 +101,108 @@ def run_simulation(db: Session, scenario: Scenario) -> List[Dict[str, Any]]:
     1. Chercher si le produit existe chez le labo cible
     2. Calculer la remise catalogue (propre a cette ligne)
     3. Calculer le complement de remontee selon la regle
+
+    Retourne des dicts prets a l'INSERT (colonnes de ResultatSimulation),
+    a enregistrer avec persist_resultats.
+
+    Les calculs sont faits sur des tableaux NumPy (une colonne par grandeur).
+    Les montants et % sont retournes en float, sans passer par Decimal: les
+    colonnes Numeric(x, 2) de ResultatSimulation les arrondissent a l'INSERT
+    (le driver envoie repr(float), comme le faisait Decimal(str(float))).
     """
     resultats = []
 
     # Recuperer le % negocie du labo
     labo = db.query(Laboratoire).filter(Laboratoire.id == scenario.laboratoire_id).first()
     remise_negociee = float(scenario.remise_simulee or labo.remise_negociee or 0)
+    remise_ligne_defaut = labo.remise_ligne_defaut
 
-    # Recuperer les ventes
-    ventes = db.query(MesVentes).all()
-
-    # Recuperer le catalogue du labo indexe par presentation_id
-    catalogue = db.query(CatalogueProduit).filter(
-        CatalogueProduit.laboratoire_id == scenario.laboratoire_id
+    # Recuperer les ventes (colonnes utiles uniquement)
+    ventes = db.query(
+        MesVentes.presentation_id,
+        MesVentes.montant_annuel,
+        MesVentes.quantite_annuelle
     ).all()
-    catalogue_by_presentation = {p.presentation_id: p for p in catalogue if p.presentation_id}
 
-    for vente in ventes:
-        montant_ht = float(vente.montant_annuel or 0)
-        quantite = vente.quantite_annuelle or 0
+    # Recuperer le catalogue du labo indexe par presentation_id, limite aux
+    # presentations presentes dans les ventes (un seul parametre tableau = ANY)
+    vente_pres_ids = list({v.presentation_id for v in ventes if v.presentation_id})
+    catalogue = db.query(
+        CatalogueProduit.id,
+        CatalogueProduit.presentation_id,
+        CatalogueProduit.remise_pct,
+        CatalogueProduit.remontee_pct
+    ).filter(
+        CatalogueProduit.laboratoire_id == scenario.laboratoire_id,
+        CatalogueProduit.presentation_id == any_(
+            bindparam("presentation_ids", vente_pres_ids, type_=ARRAY(Integer))
+        )
+    ).all() if vente_pres_ids else []
+    catalogue_by_presentation = {p.presentation_id: p for p in catalogue}
 
-        # Chercher le produit dans le catalogue du labo
-        produit = None
-        if vente.presentation_id:
-            produit = catalogue_by_presentation.get(vente.presentation_id)
+    # Catalogue en tableaux alignes, tries par presentation_id
+    produits = sorted(catalogue_by_presentation.values(), key=lambda p: p.presentation_id)
+    cat_presentation_ids = np.array([p.presentation_id for p in produits], dtype=np.int64)
+    cat_remise_ligne = np.array(
+        [float(p.remise_pct or remise_ligne_defaut or 0) for p in produits], dtype=np.float64
+    )
+    cat_remontee = np.array(
+        [np.nan if p.remontee_pct is None else float(p.remontee_pct) for p in produits],
+        dtype=np.float64
+    )
 
-        if produit:
-            # Produit DISPONIBLE
-            remise_ligne = float(produit.remise_pct or labo.remise_ligne_defaut or 0)
-            montant_remise_ligne = montant_ht * (remise_ligne / 100)
-
-            # Determiner le % cible de remontee
-            if produit.remontee_pct is None:
-                # Remontee normale -> % negocie du labo
-                remontee_cible = remise_negociee
-                statut_remontee = "normal"
-            elif float(produit.remontee_pct) == 0:
-                # Exclu -> pas de remontee
-                remontee_cible = remise_ligne
-                statut_remontee = "exclu"
-            else:
-                # Remontee partielle -> % specifique
-                remontee_cible = float(produit.remontee_pct)
-                statut_remontee = "partiel"
-
-            # Calcul du complement
-            complement_pct = max(0, remontee_cible - remise_ligne)
-            montant_remontee = montant_ht * (complement_pct / 100)
-            montant_total_remise = montant_remise_ligne + montant_remontee
-            remise_totale = remise_ligne + complement_pct
+    # Ventes en colonnes (presentation_id absent -> -1, jamais dans le catalogue)
+    vente_presentation_ids = np.array(
+        [v.presentation_id if v.presentation_id else -1 for v in ventes], dtype=np.int64
+    )
+    montant_ht = np.array([float(v.montant_annuel or 0) for v in ventes], dtype=np.float64)
+
+    # Lookup catalogue par recherche dichotomique
+    if len(cat_presentation_ids):
+        pos = np.searchsorted(cat_presentation_ids, vente_presentation_ids)
+        pos = np.minimum(pos, len(cat_presentation_ids) - 1)
+        disponible = cat_presentation_ids[pos] == vente_presentation_ids
+    else:
+        # Catalogue vide: aucune vente disponible, tableaux factices d'une case pour l'indexation
+        pos = np.zeros(len(ventes), dtype=np.intp)
+        disponible = np.zeros(len(ventes), dtype=bool)
+        cat_remise_ligne = cat_remontee = np.zeros(1, dtype=np.float64)
+
+    # Statut/cible de remontee par produit, reportes sur les ventes
+    cat_statut, cat_remontee_cible = _cibles_remontee(cat_remise_ligne, cat_remontee, remise_negociee)
+    statut_code = cat_statut[pos]
+    remontee_cible = cat_remontee_cible[pos]
+
+    remise_ligne = cat_remise_ligne[pos]
+    (
+        montant_remise_ligne, montant_remontee, remise_totale, montant_total_remise
+    ) = _calculer_remises(montant_ht, remise_ligne, remontee_cible)
+
+    produit_ids = [p.id for p in produits]
+
+    for vente, dispo, idx, statut, mht, rl, mrl, cible, mr, rt, mtr in zip(
+        ventes, disponible.tolist(), pos.tolist(), statut_code.tolist(), montant_ht.tolist(),
+        remise_ligne.tolist(), montant_remise_ligne.tolist(), remontee_cible.tolist(),
+        montant_remontee.tolist(), remise_totale.tolist(), montant_total_remise.tolist()
+    ):
+        quantite = vente.quantite_annuelle or 0
 
+        if dispo:
+            # Produit DISPONIBLE
             resultats.append({
                 "scenario_id": scenario.id,
                 "presentation_id": vente.presentation_id,
                 "quantite": quantite,
-                "montant_ht": Decimal(str(montant_ht)),
+                "montant_ht": mht,
                 "disponible": True,
-                "produit_id": produit.id,
-                "remise_ligne": Decimal(str(remise_ligne)),
-                "montant_remise_ligne": Decimal(str(montant_remise_ligne)),
-                "statut_remontee": statut_remontee,
-                "remontee_cible": Decimal(str(remontee_cible)),
-                "montant_remontee": Decimal(str(montant_remontee)),
-                "remise_totale": Decimal(str(remise_totale)),
-                "montant_total_remise": Decimal(str(montant_total_remise)),
+                "produit_id": produit_ids[idx],
+                "remise_ligne": rl,
+                "montant_remise_ligne": mrl,
+                "statut_remontee": _STATUTS_REMONTEE[statut],
+                "remontee_cible": cible,
+                "montant_remontee": mr,
+                "remise_totale": rt,
+                "montant_total_remise": mtr,
             })
         else:
             # Produit NON DISPONIBLE
@@ -85,39 +210,79 @@ def run_simulation(db: Session, scenario: Scenario) -> List[Dict[str, Any]]:
                 "scenario_id": scenario.id,
                 "presentation_id": vente.presentation_id,
                 "quantite": quantite,
-                "montant_ht": Decimal(str(montant_ht)),
+                "montant_ht": mht,
                 "disponible": False,
                 "produit_id": None,
-                "remise_ligne": Decimal("0"),
-                "montant_remise_ligne": Decimal("0"),
+                "remise_ligne": 0.0,
+                "montant_remise_ligne": 0.0,
                 "statut_remontee": "indisponible",
-                "remontee_cible": Decimal("0"),
-                "montant_remontee": Decimal("0"),
-                "remise_totale": Decimal("0"),
-                "montant_total_remise": Decimal("0"),
+                "remontee_cible": 0.0,
+                "montant_remontee": 0.0,
+                "remise_totale": 0.0,
+                "montant_total_remise": 0.0,
             })
 
     return resultats
 
 
+def persist_resultats(db: Session, resultats: List[Dict[str, Any]], batch_size: int = 1000) -> int:
+    """
+    Enregistre les resultats de run_simulation en INSERT multi-lignes par paquets
+    (executemany sur la table, sans unit-of-work ORM). Ne commit pas.
+
+    Returns:
+        Nombre de lignes inserees
+    """
+    for i in range(0, len(resultats), batch_size):
+        db.execute(ResultatSimulation.__table__.insert(), resultats[i:i + batch_size])
+    return len(resultats)
+
+
 def calculate_totaux(resultats: List[ResultatSimulation]) -> TotauxSimulation:
-    """Calcule les totaux a partir des resultats de simulation."""
-    disponibles = [r for r in resultats if r.disponible]
-    non_disponibles = [r for r in resultats if not r.disponible]
-    exclus = [r for r in disponibles if r.statut_remontee == "exclu"]
-    eligibles = [r for r in disponibles if r.statut_remontee != "exclu"]
+    """
+    Calcule les totaux a partir des resultats de simulation
+    (instances ResultatSimulation ou lignes db.query(*TOTAUX_COLUMNS)).
+
+    Une seule passe Python sur les resultats charge les colonnes utiles dans un
+    tableau structure (aucune liste intermediaire); toutes les sommes et tous
+    les comptages sont ensuite des reductions NumPy.
+    """
+    arr = np.fromiter(
+        (
+            (
+                float(r.montant_ht or 0),
+                float(r.montant_remise_ligne or 0),
+                float(r.montant_remontee or 0),
+                float(r.montant_total_remise or 0),
+                bool(r.disponible),
+                r.statut_remontee == "exclu",
+            )
+            for r in resultats
+        ),
+        dtype=_TOTAUX_DTYPE,
+        count=len(resultats),
+    )
+    montant_ht = arr['montant_ht']
+    disponible = arr['disponible']
+    exclu = disponible & arr['exclu']
+    eligible = disponible & ~arr['exclu']
+
+    nb_disponibles = int(np.count_nonzero(disponible))
+    nb_exclus = int(np.count_nonzero(exclu))
 
-    total_ht_dispo = sum(float(r.montant_ht or 0) for r in disponibles)
-    total_ht_eligible = sum(float(r.montant_ht or 0) for r in eligibles)
+    # Sommes masquees avec where=: pas de copie des sous-tableaux filtres
+    total_ht_dispo = float(montant_ht.sum(where=disponible))
+    total_ht_eligible = float(montant_ht.sum(where=eligible))
+    total_ht_exclu = float(montant_ht.sum(where=exclu))
 
-    chiffre_total = sum(float(r.montant_ht or 0) for r in resultats)
-    chiffre_perdu = sum(float(r.montant_ht or 0) for r in non_disponibles)
+    chiffre_total = float(montant_ht.sum())
+    chiffre_perdu = float(montant_ht.sum(where=~disponible))
 
-    total_remise_ligne = sum(float(r.montant_remise_ligne or 0) for r in resultats)
-    total_remontee = sum(float(r.montant_remontee or 0) for r in resultats)
-    total_remise_globale = sum(float(r.montant_total_remise or 0) for r in resultats)
+    total_remise_ligne = float(arr['montant_remise_ligne'].sum())
+    total_remontee = float(arr['montant_remontee'].sum())
+    total_remise_globale = float(arr['montant_total_remise'].sum())
 
-    taux_couverture = (len(disponibles) / len(resultats) * 100) if resultats else 0
+    taux_couverture = (nb_disponibles / len(resultats) * 100) if resultats else 0
 
     remise_ligne_moyenne = (total_remise_ligne / total_ht_dispo * 100) if total_ht_dispo else 0
     remise_totale_ponderee = (total_remise_globale / total_ht_dispo * 100) if total_ht_dispo else 0
@@ -127,7 +292,7 @@ def calculate_totaux(resultats: List[ResultatSimulation]) -> TotauxSimulation:
         chiffre_realisable_ht=Decimal(str(total_ht_dispo)),
         chiffre_perdu_ht=Decimal(str(chiffre_perdu)),
         chiffre_eligible_remontee_ht=Decimal(str(total_ht_eligible)),
-        chiffre_exclu_remontee_ht=Decimal(str(sum(float(r.montant_ht or 0) for r in exclus))),
+        chiffre_exclu_remontee_ht=Decimal(str(total_ht_exclu)),
         total_remise_ligne=Decimal(str(total_remise_ligne)),
         total_remontee=Decimal(str(total_remontee)),
         total_remise_globale=Decimal(str(total_remise_globale)),
@@ -135,8 +300,8 @@ def calculate_totaux(resultats: List[ResultatSimulation]) -> TotauxSimulation:
         remise_ligne_moyenne=Decimal(str(remise_ligne_moyenne)),
         remise_totale_ponderee=Decimal(str(remise_totale_ponderee)),
         nb_produits_total=len(resultats),
-        nb_produits_disponibles=len(disponibles),
-        nb_produits_manquants=len(non_disponibles),
-        nb_produits_exclus=len(exclus),
-        nb_produits_eligibles=len(eligibles),
+        nb_produits_disponibles=nb_disponibles,
+        nb_produits_manquants=len(resultats) - nb_disponibles,
+        nb_produits_exclus=nb_exclus,
+        nb_produits_eligibles=nb_disponibles - nb_exclus,
     )
@@ -2,20 +2,160 @@
 Logging centralisé avec métriques pour opérations critiques.
 Adapté aux gros volumes (milliers de lignes).
 """
+import asyncio
+import atexit
 import logging
+import queue
+import threading
 import time
+import weakref
+from collections import defaultdict
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from datetime import datetime
 from typing import Optional, Dict, Any
-from functools import wraps
+from functools import lru_cache, wraps
 import os
 
-# Créer le dossier logs s'il n'existe pas
+# Dossier des logs (cree au premier record ecrit, pas a l'import)
 LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "logs")
-os.makedirs(LOG_DIR, exist_ok=True)
 
-# Configuration du logger
+class BufferedFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler a tampon de 64 Ko: pas de flush (ni d'appel systeme) par record.
+
+    Le tampon est vide toutes les secondes par le timer de flush partage (un seul
+    thread pour tous les handlers, demarre avec start_log_listener), immediatement
+    pour les records ERROR et plus, et a l'arret (logging.shutdown ferme les handlers).
+    La taille du fichier est suivie en memoire pour la rotation: stream.tell()
+    viderait le tampon a chaque record.
+    """
+
+    BUFFER_SIZE = 65536
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, filename: str, mode: str = 'a', maxBytes: int = 0, backupCount: int = 0,
+                 encoding: Optional[str] = None, delay: bool = False):
+        self._size = 0
+        super().__init__(
+            filename, mode=mode, maxBytes=maxBytes, backupCount=backupCount,
+            encoding=encoding, delay=delay
+        )
+        _buffered_handlers.add(self)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        stream = open(
+            self.baseFilename, self.mode, buffering=self.BUFFER_SIZE,
+            encoding=self.encoding, errors=self.errors
+        )
+        self._size = os.path.getsize(self.baseFilename)
+        return stream
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            msg = self.format(record) + self.terminator
+            # maxBytes est en octets: compter la taille encodee, pas les caractères
+            size = len(msg.encode(self.encoding or 'utf-8', self.errors or 'strict'))
+            if self.maxBytes > 0 and self._size + size >= self.maxBytes:
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(msg)
+            self._size += size
+            if record.levelno >= logging.ERROR:
+                self.stream.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+# Handlers a vider par le timer de flush (references faibles)
+_buffered_handlers = weakref.WeakSet()
+
+
+class _DispatchHandler(logging.Handler):
+    """
+    Handler du thread d'ecriture: transmet chaque record aux handlers
+    (fichier + console) du logger configure qui l'a emis.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._handlers: Dict[str, tuple] = {}
+
+    def register(self, name: str, *handlers: logging.Handler):
+        self._handlers[name] = handlers
+
+    def handle(self, record: logging.LogRecord):
+        # Logger configure le plus proche (les loggers enfants remontent au parent)
+        name = record.name
+        handlers = self._handlers.get(name)
+        while handlers is None and "." in name:
+            name = name.rsplit(".", 1)[0]
+            handlers = self._handlers.get(name)
+        for handler in handlers or ():
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+    def emit(self, record: logging.LogRecord):
+        self.handle(record)
+
+
+# File unique + un seul thread d'ecriture pour tous les loggers:
+# les appels logger.info() ne font qu'un put() dans la file, le formatage
+# et les ecritures disque/console se font hors du thread appelant.
+# Aucun thread n'est demarre a l'import: l'application appelle
+# start_log_listener() dans son lifespan (les records emis avant sont
+# conserves dans la file). Hors application, l'appeler avant de loguer.
+_log_queue: queue.Queue = queue.Queue(-1)
+_dispatch_handler = _DispatchHandler()
+_log_listener = QueueListener(_log_queue, _dispatch_handler)
+_flush_stop = threading.Event()
+_listener_lock = threading.Lock()
+_listener_started = False
+
+
+def _flush_loop():
+    """Timer de flush partage par tous les BufferedFileHandler."""
+    while not _flush_stop.wait(BufferedFileHandler.FLUSH_INTERVAL):
+        for handler in list(_buffered_handlers):
+            handler.flush()
+
+
+def start_log_listener() -> None:
+    """Demarre le thread d'ecriture des logs et le timer de flush (idempotent)."""
+    global _listener_started
+    with _listener_lock:
+        if _listener_started:
+            return
+        _listener_started = True
+        _flush_stop.clear()
+        _log_listener.start()
+        threading.Thread(target=_flush_loop, name="log-flush", daemon=True).start()
+
+
+def stop_log_listener() -> None:
+    """Ecrit les records restants puis arrete les threads de logging (idempotent)."""
+    global _listener_started
+    with _listener_lock:
+        if not _listener_started:
+            return
+        _listener_started = False
+        _log_listener.stop()
+        _flush_stop.set()
+        for handler in list(_buffered_handlers):
+            handler.flush()
+
+
+atexit.register(stop_log_listener)
+
+
+# Configuration du logger (memoisee: un seul setup par nom)
+@lru_cache(maxsize=None)
 def setup_logger(name: str) -> logging.Logger:
-    """Configure un logger avec fichier et console."""
+    """Configure un logger avec fichier et console (ecritures via la file de logs)."""
     logger = logging.getLogger(name)
     logger.setLevel(logging.DEBUG)
 
@@ -29,10 +169,13 @@ def setup_logger(name: str) -> logging.Logger:
         datefmt='%Y-%m-%d %H:%M:%S'
     )
 
-    # Handler fichier (logs persistants)
-    file_handler = logging.FileHandler(
+    # Handler fichier (logs persistants, rotation a 5 Mo x 5, ouvert au premier record)
+    file_handler = BufferedFileHandler(
         os.path.join(LOG_DIR, f"{name}.log"),
-        encoding='utf-8'
+        maxBytes=5 * 1024 * 1024,
+        backupCount=5,
+        encoding='utf-8',
+        delay=True
     )
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(formatter)
@@ -42,8 +185,9 @@ def setup_logger(name: str) -> logging.Logger:
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(formatter)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # Les handlers reels tournent dans le thread du listener
+    _dispatch_handler.register(name, file_handler, console_handler)
+    logger.addHandler(QueueHandler(_log_queue))
 
     return logger
 
@@ -54,18 +198,30 @@ class OperationMetrics:
     Logue par batch pour éviter de flooder les logs.
     """
 
+    __slots__ = (
+        'logger', 'operation_name', 'total_items', 'batch_size',
+        'start_ns', 'processed', 'success', 'errors', 'last_log_ns',
+        'custom_metrics', '_next_log_at', '_progress_fmt',
+    )
+
     def __init__(self, logger: logging.Logger, operation_name: str, total_items: int = 0, batch_size: int = 100):
         self.logger = logger
         self.operation_name = operation_name
         self.total_items = total_items
         self.batch_size = batch_size
 
-        self.start_time = time.time()
+        self.start_ns = time.monotonic_ns()
         self.processed = 0
         self.success = 0
         self.errors = 0
-        self.last_log_time = self.start_time
-        self.custom_metrics: Dict[str, Any] = {}
+        self.last_log_ns = self.start_ns
+        self.custom_metrics: Dict[str, Any] = defaultdict(int)
+        self._next_log_at = batch_size
+        # Format de progression fixe pour toute l'operation
+        self._progress_fmt = (
+            "[PROGRESS] %s | %d/%d (%.1f%%) | %.1f/s | ETA: %.0fs" if total_items
+            else "[PROGRESS] %s | %d | %.1f/s | ETA: %.0fs"
+        )
 
     def start(self, **extra_info):
         """Log le début de l'opération."""
@@ -87,32 +243,37 @@ class OperationMetrics:
             self.errors += 1
 
         # Mettre à jour les métriques custom
-        for key, value in metrics.items():
-            if key not in self.custom_metrics:
-                self.custom_metrics[key] = 0
-            self.custom_metrics[key] += value if isinstance(value, (int, float)) else 1
-
-        # Log tous les batch_size items
-        if self.processed % self.batch_size == 0:
+        if metrics:
+            custom_metrics = self.custom_metrics
+            for key, value in metrics.items():
+                custom_metrics[key] += value if isinstance(value, (int, float)) else 1
+
+        # Log tous les batch_size items (seuil precalcule, pas de modulo par appel)
+        if self.processed >= self._next_log_at:
+            self._next_log_at += self.batch_size
             self._log_progress()
 
     def _log_progress(self):
-        """Log la progression."""
-        elapsed = time.time() - self.start_time
+        """Log la progression (rien n'est calcule ni formate si INFO est desactive)."""
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+
+        elapsed = (time.monotonic_ns() - self.start_ns) / 1e9
         rate = self.processed / elapsed if elapsed > 0 else 0
 
         pct = (self.processed / self.total_items * 100) if self.total_items else 0
         eta = ((self.total_items - self.processed) / rate) if rate > 0 and self.total_items else 0
 
-        msg = f"[PROGRESS] {self.operation_name} | {self.processed}"
+        # Formatage differe (%-style) avec le format choisi a l'init
         if self.total_items:
-            msg += f"/{self.total_items} ({pct:.1f}%)"
-        msg += f" | {rate:.1f}/s | ETA: {eta:.0f}s"
+            args = (self.operation_name, self.processed, self.total_items, pct, rate, eta)
+        else:
+            args = (self.operation_name, self.processed, rate, eta)
 
         if self.errors:
-            msg += f" | errors: {self.errors}"
-
-        self.logger.info(msg)
+            self.logger.info(self._progress_fmt + " | errors: %d", *args, self.errors)
+        else:
+            self.logger.info(self._progress_fmt, *args)
 
     def add_metric(self, name: str, value: Any):
         """Ajoute une métrique custom."""
@@ -120,33 +281,11 @@ class OperationMetrics:
 
     def finish(self, **extra_info):
         """Log la fin de l'opération avec résumé complet."""
-        elapsed = time.time() - self.start_time
+        elapsed = (time.monotonic_ns() - self.start_ns) / 1e9
         rate = self.processed / elapsed if elapsed > 0 else 0
 
-        # Résumé principal
-        summary = [
-            f"[END] {self.operation_name}",
-            f"durée: {elapsed:.2f}s",
-            f"traités: {self.processed}",
-            f"succès: {self.success}",
-            f"erreurs: {self.errors}",
-            f"vitesse: {rate:.1f}/s",
-        ]
-
-        # Métriques custom
-        if self.custom_metrics:
-            for key, value in self.custom_metrics.items():
-                if isinstance(value, float):
-                    summary.append(f"{key}: {value:.2f}")
-                else:
-                    summary.append(f"{key}: {value}")
-
-        # Extra info
-        if extra_info:
-            for key, value in extra_info.items():
-                summary.append(f"{key}: {value}")
-
-        self.logger.info(" | ".join(summary))
+        if self.logger.isEnabledFor(logging.INFO):
+            self._log_summary(elapsed, rate, extra_info)
 
         return {
             "duration_s": round(elapsed, 2),
@@ -157,45 +296,65 @@ class OperationMetrics:
             **self.custom_metrics
         }
 
+    def _log_summary(self, elapsed: float, rate: float, extra_info: Dict[str, Any]):
+        """Log le résumé de fin d'opération."""
+        # Résumé principal
+        summary = (
+            f"[END] {self.operation_name} | durée: {elapsed:.2f}s | traités: {self.processed}"
+            f" | succès: {self.success} | erreurs: {self.errors} | vitesse: {rate:.1f}/s"
+        )
+
+        # Métriques custom et extra info (sections optionnelles)
+        extras = [
+            f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}"
+            for key, value in self.custom_metrics.items()
+        ]
+        extras.extend(f"{key}: {value}" for key, value in extra_info.items())
+        if extras:
+            summary = f"{summary} | {' | '.join(extras)}"
+
+        self.logger.info(summary)
+
 
 def log_operation(logger_name: str, operation_name: str):
     """
     Décorateur pour logger automatiquement une opération.
     """
     def decorator(func):
-        @wraps(func)
-        async def async_wrapper(*args, **kwargs):
-            logger = setup_logger(logger_name)
-            start = time.time()
-            logger.info(f"[START] {operation_name} | args: {kwargs.keys()}")
-            try:
-                result = await func(*args, **kwargs)
-                elapsed = time.time() - start
-                logger.info(f"[END] {operation_name} | durée: {elapsed:.2f}s | succès")
-                return result
-            except Exception as e:
-                elapsed = time.time() - start
-                logger.error(f"[ERROR] {operation_name} | durée: {elapsed:.2f}s | {str(e)}")
-                raise
+        # Resolus une fois a la decoration, pas a chaque appel
+        logger = setup_logger(logger_name)
+
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start_ns = time.monotonic_ns()
+                logger.info("[START] %s | args: %s", operation_name, kwargs.keys())
+                try:
+                    result = await func(*args, **kwargs)
+                    elapsed = (time.monotonic_ns() - start_ns) / 1e9
+                    logger.info("[END] %s | durée: %.2fs | succès", operation_name, elapsed)
+                    return result
+                except Exception as e:
+                    elapsed = (time.monotonic_ns() - start_ns) / 1e9
+                    logger.error("[ERROR] %s | durée: %.2fs | %s", operation_name, elapsed, e)
+                    raise
+
+            return async_wrapper
 
         @wraps(func)
         def sync_wrapper(*args, **kwargs):
-            logger = setup_logger(logger_name)
-            start = time.time()
-            logger.info(f"[START] {operation_name} | args: {kwargs.keys()}")
+            start_ns = time.monotonic_ns()
+            logger.info("[START] %s | args: %s", operation_name, kwargs.keys())
             try:
                 result = func(*args, **kwargs)
-                elapsed = time.time() - start
-                logger.info(f"[END] {operation_name} | durée: {elapsed:.2f}s | succès")
+                elapsed = (time.monotonic_ns() - start_ns) / 1e9
+                logger.info("[END] %s | durée: %.2fs | succès", operation_name, elapsed)
                 return result
             except Exception as e:
-                elapsed = time.time() - start
-                logger.error(f"[ERROR] {operation_name} | durée: {elapsed:.2f}s | {str(e)}")
+                elapsed = (time.monotonic_ns() - start_ns) / 1e9
+                logger.error("[ERROR] %s | durée: %.2fs | %s", operation_name, elapsed, e)
                 raise
 
-        import asyncio
-        if asyncio.iscoroutinefunction(func):
-            return async_wrapper
         return sync_wrapper
     return decorator
 
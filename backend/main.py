@@ -1,4 +1,5 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
@@ -6,7 +7,8 @@ from dotenv import load_dotenv
 # Charger les variables d'environnement depuis .env (racine du projet)
 load_dotenv(dotenv_path="../.env")
 
-from app.db import engine, Base
+from app.db import engine, Base, warm_pool
+from app.utils.logger import start_log_listener, stop_log_listener
 from app.api import (
     laboratoires_router,
     presentations_router,
@@ -27,9 +29,12 @@ from app.api import (
 async def lifespan(app: FastAPI):
     """Lifecycle hooks for startup/shutdown."""
     # Startup
+    start_log_listener()
     Base.metadata.create_all(bind=engine)
+    warm_pool()
     yield
     # Shutdown
+    stop_log_listener()
 
 
 app = FastAPI(
@@ -37,6 +42,8 @@ app = FastAPI(
     description="API pour la simulation et comparaison des remises laboratoires",
     version="1.0.0",
     lifespan=lifespan,
+    # Serialisation JSON des reponses par orjson (C) au lieu du json stdlib
+    default_response_class=ORJSONResponse,
 )
 
 # CORS